@@ -37,3 +37,35 @@ class TrocaSenhaForm(forms.Form):
     senha_atual = forms.CharField(widget=forms.PasswordInput(attrs={"class": "form-control"}))
     nova_senha = forms.CharField(widget=forms.PasswordInput(attrs={"class": "form-control"}))
     confirmar_senha = forms.CharField(widget=forms.PasswordInput(attrs={"class": "form-control"}))
+
+
+class ImportacaoAlunosForm(forms.Form):
+    arquivo = forms.FileField(
+        label="Arquivo CSV ou JSON",
+        help_text="Colunas: nome, email, data_nascimento (AAAA-MM-DD ou DD/MM/AAAA) e, opcionalmente, ativo.",
+        widget=forms.ClearableFileInput(attrs={"class": "form-control", "accept": ".csv,.json"}),
+    )
+    ignorar_invalidos = forms.BooleanField(
+        label="Importar as linhas validas mesmo se houver erros",
+        required=False,
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input"}),
+    )
+
+    def clean_arquivo(self):
+        arquivo = self.cleaned_data["arquivo"]
+        if not arquivo.name.lower().endswith((".csv", ".json")):
+            raise forms.ValidationError("Envie um arquivo .csv ou .json.")
+        return arquivo
+
+
+class LinhaImportacaoForm(forms.Form):
+    nome = forms.CharField(max_length=150)
+    email = forms.EmailField()
+    data_nascimento = forms.DateField(input_formats=["%Y-%m-%d", "%d/%m/%Y"])
+    ativo = forms.BooleanField(required=False)
+
+    def clean_ativo(self):
+        bruto = self.data.get("ativo")
+        if bruto in (None, ""):
+            return True
+        return str(bruto).strip().lower() not in {"0", "false", "nao", "n", "inativo"}
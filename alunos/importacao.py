@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from alunos.forms import LinhaImportacaoForm
+from treinos.models import Aluno
+from treinos.usuarios import SENHA_PADRAO_ALUNO, alocar_usernames, id_grupo_aluno, nome_para_usuario
+from treinos.utils import CHAVE_VERSAO_ALUNOS, em_lotes, invalidar_versao
+
+User = get_user_model()
+
+CAMPOS = ("nome", "email", "data_nascimento", "ativo")
+
+
+@dataclass
+class ResultadoImportacao:
+    linhas: int = 0
+    criados: int = 0
+    erros: list[tuple[int, list[str]]] = field(default_factory=list)
+
+
+def ler_registros(conteudo: bytes | str, formato: str) -> list[dict]:
+    """
+    Le um CSV (com cabecalho, separado por virgula ou ponto e virgula) ou uma lista JSON de objetos.
+    """
+    if isinstance(conteudo, bytes):
+        conteudo = conteudo.decode("utf-8-sig")
+    if formato == "json":
+        dados = json.loads(conteudo)
+        if not isinstance(dados, list) or not all(isinstance(item, dict) for item in dados):
+            raise ValueError("O JSON deve ser uma lista de objetos.")
+        return dados
+    if formato == "csv":
+        amostra = conteudo[:4096]
+        delimitador = ";" if amostra.count(";") > amostra.count(",") else ","
+        leitor = csv.DictReader(io.StringIO(conteudo), delimiter=delimitador)
+        return [{(chave or "").strip(): (valor or "").strip() for chave, valor in linha.items()} for linha in leitor]
+    raise ValueError(f"Formato nao suportado: {formato}")
+
+
+def validar_registros(registros: Iterable[dict]) -> tuple[list[tuple[int, dict]], list[tuple[int, list[str]]]]:
+    """
+    Valida todas as linhas antes de gravar qualquer coisa. Emails repetidos no
+    arquivo ou ja cadastrados sao checados em uma consulta, sem diferenciar caixa.
+    Linhas sao numeradas a partir de 2 (a 1 e o cabecalho do CSV).
+    """
+    validos: list[tuple[int, dict]] = []
+    erros: list[tuple[int, list[str]]] = []
+    vistos: dict[str, int] = {}
+    for numero, registro in enumerate(registros, start=2):
+        form = LinhaImportacaoForm({campo: registro.get(campo) for campo in CAMPOS})
+        if not form.is_valid():
+            erros.append((numero, [f"{campo}: {' '.join(msgs)}" for campo, msgs in form.errors.items()]))
+            continue
+        email = form.cleaned_data["email"].lower()
+        if email in vistos:
+            erros.append((numero, [f"email: repetido no arquivo (linha {vistos[email]})."]))
+            continue
+        vistos[email] = numero
+        validos.append((numero, form.cleaned_data))
+
+    existentes = set()
+    for lote in em_lotes(vistos, 500):
+        existentes.update(
+            Aluno.objects.annotate(email_normalizado=Lower("email"))
+            .filter(email_normalizado__in=lote)
+            .values_list("email_normalizado", flat=True)
+        )
+    if existentes:
+        erros.extend(
+            (numero, ["email: ja cadastrado."]) for numero, dados in validos if dados["email"].lower() in existentes
+        )
+        validos = [(numero, dados) for numero, dados in validos if dados["email"].lower() not in existentes]
+    erros.sort()
+    return validos, erros
+
+
+def importar_alunos(
+    registros: Iterable[dict],
+    *,
+    chunk_size: int = 500,
+    ignorar_invalidos: bool = False,
+    dry_run: bool = False,
+) -> ResultadoImportacao:
+    """
+    Cria alunos, usuarios e o vinculo ao grupo `aluno` em lotes com bulk_create,
+    sem passar pelo sinal de criacao (uma consulta por colisao de username e um
+    hash de senha por aluno). Com erros de validacao nada e gravado, a menos
+    que `ignorar_invalidos` seja usado.
+    """
+    registros = list(registros)
+    validos, erros = validar_registros(registros)
+    resultado = ResultadoImportacao(linhas=len(registros), erros=erros)
+    if dry_run or (erros and not ignorar_invalidos) or not validos:
+        return resultado
+
+    usernames = alocar_usernames([dados["nome"] for _, dados in validos])
+    senha = make_password(SENHA_PADRAO_ALUNO)
+    grupo_id = id_grupo_aluno()
+    for lote in em_lotes(zip(validos, usernames), chunk_size):
+        with transaction.atomic():
+            usuarios = User.objects.bulk_create(
+                [
+                    User(
+                        username=username,
+                        email=dados["email"],
+                        password=senha,
+                        first_name=nome_para_usuario(dados["nome"])[0],
+                        last_name=nome_para_usuario(dados["nome"])[1],
+                    )
+                    for (_, dados), username in lote
+                ]
+            )
+            User.groups.through.objects.bulk_create(
+                [User.groups.through(user_id=usuario.pk, group_id=grupo_id) for usuario in usuarios]
+            )
+            Aluno.objects.bulk_create(
+                [
+                    Aluno(
+                        nome=dados["nome"],
+                        email=dados["email"],
+                        data_nascimento=dados["data_nascimento"],
+                        ativo=dados["ativo"],
+                        usuario=usuario,
+                    )
+                    for ((_, dados), _), usuario in zip(lote, usuarios)
+                ]
+            )
+        resultado.criados += len(lote)
+
+    invalidar_versao(CHAVE_VERSAO_ALUNOS)
+    return resultado
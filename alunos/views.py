@@ -6,9 +6,10 @@ from django.http import HttpRequest, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils.translation import gettext_lazy as _
 
-from alunos.forms import AlunoForm, PerfilAlunoForm
+from alunos.forms import AlunoForm, ImportacaoAlunosForm, PerfilAlunoForm
+from alunos.importacao import importar_alunos, ler_registros
 from treinos.models import Aluno
-from treinos.utils import bloquear_para_aluno, obter_aluno_logado, ordenar_e_paginar
+from treinos.utils import bloquear_para_aluno, ordenar_e_paginar
 
 
 @login_required
@@ -17,7 +18,7 @@ def lista_alunos(request: HttpRequest) -> HttpResponse:
     sortable_fields = ("nome", "email", "data_nascimento", "ativo")
     page_obj, sort_field, direction = ordenar_e_paginar(
         request,
-        Aluno.objects.all(),
+        Aluno.objects.select_related("usuario"),
         sortable_fields,
         "nome",
         per_page=12,
@@ -47,6 +48,28 @@ def aluno_create(request: HttpRequest) -> HttpResponse:
     return render(request, "alunos/form.html", {"form": form})
 
 
+@login_required
+@bloquear_para_aluno
+def aluno_importar(request: HttpRequest) -> HttpResponse:
+    form = ImportacaoAlunosForm(request.POST or None, request.FILES or None)
+    resultado = None
+    if request.method == "POST" and form.is_valid():
+        arquivo = form.cleaned_data["arquivo"]
+        try:
+            registros = ler_registros(arquivo.read(), arquivo.name.rsplit(".", 1)[-1].lower())
+        except (ValueError, UnicodeDecodeError) as exc:
+            form.add_error("arquivo", _("Nao foi possivel ler o arquivo: %(erro)s") % {"erro": exc})
+        else:
+            resultado = importar_alunos(registros, ignorar_invalidos=form.cleaned_data["ignorar_invalidos"])
+            if resultado.criados:
+                messages.success(request, _("%(total)d alunos importados.") % {"total": resultado.criados})
+                if not resultado.erros:
+                    return redirect("treinos:lista_alunos")
+            elif resultado.erros:
+                messages.error(request, _("Nenhum aluno importado: corrija as linhas com erro."))
+    return render(request, "alunos/importar.html", {"form": form, "resultado": resultado})
+
+
 @login_required
 @bloquear_para_aluno
 def aluno_update(request: HttpRequest, pk: int) -> HttpResponse:
@@ -72,7 +95,7 @@ def aluno_delete(request: HttpRequest, pk: int) -> HttpResponse:
 
 @login_required
 def perfil(request: HttpRequest) -> HttpResponse:
-    aluno = obter_aluno_logado(request.user)
+    aluno = request.aluno
     form = PerfilAlunoForm(request.POST or None, instance=aluno) if aluno else None
 
     if request.method == "POST":
@@ -7,6 +7,7 @@ from django.shortcuts import get_object_or_404, redirect, render
 from django.utils.translation import gettext_lazy as _
 
 from exercicios.forms import ExercicioForm
+from treinos.catalogo import obter_catalogo
 from treinos.models import Exercicio
 from treinos.utils import bloquear_para_aluno, listar_grupos_musculares, ordenar_e_paginar
 
@@ -17,7 +18,7 @@ def lista_exercicios(request: HttpRequest) -> HttpResponse:
     sortable_fields = ("nome", "grupo_muscular")
     page_obj, sort_field, direction = ordenar_e_paginar(
         request,
-        Exercicio.objects.all(),
+        obter_catalogo(),
         sortable_fields,
         "nome",
         per_page=12,
@@ -1,21 +1,41 @@
 from django import forms
-from django.forms import inlineformset_factory
+from django.core.exceptions import ValidationError
+from django.forms import BaseInlineFormSet, inlineformset_factory
+from django.utils.functional import cached_property
 
+from treinos.catalogo import obter_catalogo
 from treinos.models import FichaTreino, Treino, TreinoExercicio
+from treinos.utils import invalidar_treino_do_dia
 
 
 class FichaTreinoForm(forms.ModelForm):
+    # Fora de Meta.fields: a view desativa as outras fichas do aluno antes de
+    # salvar uma ficha ativa, entao a restricao "uma ficha ativa por aluno" nao
+    # deve barrar o formulario. O valor so chega a instancia em save().
+    ativa = forms.BooleanField(
+        label="Ativa",
+        required=False,
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input mt-0"}),
+    )
+
     class Meta:
         model = FichaTreino
-        fields = ["nome", "motivo", "aluno", "observacoes", "ativa"]
+        fields = ["nome", "motivo", "aluno", "observacoes"]
         widgets = {
             "nome": forms.TextInput(attrs={"class": "form-control"}),
             "motivo": forms.TextInput(attrs={"class": "form-control", "list": "grupos-musculares"}),
             "aluno": forms.Select(attrs={"class": "form-control"}),
             "observacoes": forms.Textarea(attrs={"rows": 3, "class": "form-control"}),
-            "ativa": forms.CheckboxInput(attrs={"class": "form-check-input mt-0"}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["ativa"].initial = self.instance.ativa
+
+    def save(self, commit=True):
+        self.instance.ativa = self.cleaned_data["ativa"]
+        return super().save(commit=commit)
+
 
 class TreinoForm(forms.ModelForm):
     class Meta:
@@ -27,23 +47,158 @@ class TreinoForm(forms.ModelForm):
         }
 
 
+class FiltroExportacaoForm(forms.Form):
+    """
+    Filtros (via GET) das exportacoes de sessoes e fichas.
+    """
+
+    formato = forms.ChoiceField(choices=[("csv", "CSV"), ("jsonl", "JSON lines")], required=False)
+    aluno = forms.CharField(required=False)
+    aluno_id = forms.IntegerField(required=False, min_value=1)
+    ficha = forms.IntegerField(required=False, min_value=1)
+    q = forms.CharField(required=False)
+    de = forms.DateField(required=False, input_formats=["%Y-%m-%d", "%d/%m/%Y"])
+    ate = forms.DateField(required=False, input_formats=["%Y-%m-%d", "%d/%m/%Y"])
+    finalizado = forms.NullBooleanField(required=False)
+
+    def clean(self):
+        dados = super().clean()
+        if dados.get("de") and dados.get("ate") and dados["de"] > dados["ate"]:
+            raise ValidationError("A data inicial deve ser anterior a final.")
+        dados["formato"] = dados.get("formato") or "csv"
+        return dados
+
+
+class CatalogoExercicios:
+    """
+    Exercicios carregados uma vez e compartilhados por todos os forms do
+    formset: o mapa id -> objeto usado na validacao e as escolhas do select.
+    """
+
+    def __init__(self, exercicios):
+        exercicios = list(exercicios)
+        self.por_id = {exercicio.pk: exercicio for exercicio in exercicios}
+        self.escolhas = [("", "---------"), *((exercicio.pk, exercicio.nome) for exercicio in exercicios)]
+
+
+class ExercicioChoiceField(forms.ChoiceField):
+    """
+    Escolhas e validacao servidas pelo catalogo, sem uma consulta por linha.
+    """
+
+    def __init__(self, catalogo: CatalogoExercicios, **kwargs):
+        super().__init__(choices=catalogo.escolhas, **kwargs)
+        self.catalogo = catalogo
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self.catalogo.por_id[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(
+                self.error_messages["invalid_choice"], code="invalid_choice", params={"value": value}
+            ) from None
+
+    def validate(self, value):
+        # to_python ja garantiu que o valor esta no catalogo.
+        forms.Field.validate(self, value)
+
+
+class LinhaExistenteField(forms.Field):
+    """
+    Campo oculto de id das linhas existentes, resolvido pelos objetos que o
+    formset ja carregou em vez de um `queryset.get()` por linha.
+    """
+
+    widget = forms.HiddenInput
+
+    def __init__(self, existentes: dict[int, TreinoExercicio], **kwargs):
+        super().__init__(**kwargs)
+        self.existentes = existentes
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self.existentes[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError("Linha de exercicio invalida.", code="invalid_choice") from None
+
+
 class TreinoExercicioForm(forms.ModelForm):
+    # `exercicio` fica fora de Meta.fields: o objeto vem do catalogo e a
+    # checagem de existencia do ForeignKey na validacao do modelo seria mais
+    # uma consulta por linha. O valor so chega a instancia em save().
+    field_order = ["exercicio", "series", "repeticoes", "ordem"]
+
     class Meta:
         model = TreinoExercicio
-        fields = ["exercicio", "series", "repeticoes", "ordem"]
+        fields = ["series", "repeticoes", "ordem"]
         widgets = {
-            "exercicio": forms.Select(attrs={"class": "form-control"}),
             "series": forms.NumberInput(attrs={"class": "form-control", "min": 1}),
             "repeticoes": forms.NumberInput(attrs={"class": "form-control", "min": 1}),
             "ordem": forms.NumberInput(attrs={"class": "form-control", "min": 1}),
         }
         labels = {"repeticoes": "Repeticoes"}
 
+    def __init__(
+        self,
+        *args,
+        catalogo: CatalogoExercicios,
+        existentes: dict[int, TreinoExercicio] | None = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.existentes = existentes or {}
+        self.fields["exercicio"] = ExercicioChoiceField(
+            catalogo,
+            label="Exercicio",
+            initial=self.instance.exercicio_id,
+            widget=forms.Select(attrs={"class": "form-control"}),
+        )
+        self.order_fields(self.field_order)
+
+    def save(self, commit=True):
+        self.instance.exercicio = self.cleaned_data["exercicio"]
+        return super().save(commit=commit)
+
+
+class BaseTreinoExercicioFormSet(BaseInlineFormSet):
+    @cached_property
+    def catalogo(self) -> CatalogoExercicios:
+        # As escolhas valem enquanto a versao do catalogo nao mudar.
+        return obter_catalogo().derivado("fichas.escolhas", lambda catalogo: CatalogoExercicios(catalogo.exercicios))
+
+    @cached_property
+    def existentes(self) -> dict[int, TreinoExercicio]:
+        return {objeto.pk: objeto for objeto in self.get_queryset()}
+
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs["catalogo"] = self.catalogo
+        kwargs["existentes"] = self.existentes
+        return kwargs
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        # O id oculto padrao faz um `queryset.get()` por linha no POST.
+        nome = self.model._meta.pk.name
+        form.fields[nome] = LinhaExistenteField(form.existentes, initial=form.fields[nome].initial, required=False)
+
+    def save(self, commit=True):
+        objetos = super().save(commit=commit)
+        if commit:
+            # TreinoExercicio so reconta o total ao salvar ou excluir: invalida aqui, uma vez, o treino do dia do aluno.
+            invalidar_treino_do_dia(self.instance.ficha.aluno_id)
+        return objetos
+
 
 TreinoExercicioFormSet = inlineformset_factory(
     Treino,
     TreinoExercicio,
     form=TreinoExercicioForm,
+    formset=BaseTreinoExercicioFormSet,
     extra=0,
     min_num=1,
     validate_min=True,
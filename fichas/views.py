@@ -5,22 +5,37 @@ from datetime import date
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
-from django.db.models import Q
-from django.http import HttpRequest, HttpResponse
+from django.db.models import Q, prefetch_related_objects
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from fichas.forms import FichaTreinoForm, TreinoExercicioFormSet, TreinoForm
+from fichas.forms import FichaTreinoForm, FiltroExportacaoForm, TreinoExercicioFormSet, TreinoForm
+from treinos import arquivo, exportacao
+from treinos.busca import filtro_alunos, filtro_fichas
 from treinos.models import FichaTreino, Treino, TreinoDiario, TreinoProgresso
 from treinos.utils import (
+    aluno_id_em_sessao,
+    atualizar_proximo_treino,
+    avancar_proximo_treino,
     bloquear_para_aluno,
+    guardar_treino_do_dia,
+    invalidar_treino_do_dia,
+    ler_treino_do_dia,
     listar_grupos_musculares,
-    obter_aluno_logado,
-    ordenar_e_paginar,
+    montar_resumo,
+    paginar_por_cursor,
     preparar_progresso,
+    salvar_progresso,
     selecionar_treino_do_dia,
+    versao_treino_do_dia,
 )
+from treinos.volume import registrar_sessao
+
+
+def _mapa_progresso(treino: TreinoDiario) -> dict[int, TreinoProgresso]:
+    return {item.exercicio_id: item for item in TreinoProgresso.objects.filter(treino_diario=treino)}
 
 
 @login_required
@@ -31,11 +46,15 @@ def criar_ficha(request: HttpRequest) -> HttpResponse:
     if request.method == "POST" and form.is_valid():
         try:
             with transaction.atomic():
-                ficha = form.save()
+                ficha = form.save(commit=False)
                 if ficha.ativa:
-                    FichaTreino.objects.filter(aluno=ficha.aluno).exclude(pk=ficha.pk).update(ativa=False)
+                    # Desativa as demais antes de salvar: o banco garante uma unica ficha ativa por aluno.
+                    FichaTreino.objects.filter(aluno=ficha.aluno, ativa=True).update(ativa=False)
+                ficha.save()
                 if not ficha.treinos.exists():
                     Treino.objects.create(ficha=ficha, nome="A", ordem=1)
+                if ficha.ativa:
+                    atualizar_proximo_treino(ficha.aluno)
             messages.success(request, _("Ficha de treino criada. Adicione os treinos (A/B/C...)."))
             return redirect("treinos:gerenciar_treinos", ficha_id=ficha.pk)
         except Exception:
@@ -65,6 +84,8 @@ def gerenciar_treinos(request: HttpRequest, ficha_id: int) -> HttpResponse:
             form = TreinoForm(request.POST, instance=treino_em_edicao)
             if form.is_valid():
                 form.save()
+                if ficha.ativa:
+                    atualizar_proximo_treino(ficha.aluno)
                 messages.success(request, _("Treino atualizado."))
                 return redirect("treinos:gerenciar_treinos", ficha_id=ficha.pk)
         else:
@@ -73,6 +94,8 @@ def gerenciar_treinos(request: HttpRequest, ficha_id: int) -> HttpResponse:
                 treino = form.save(commit=False)
                 treino.ficha = ficha
                 treino.save()
+                if ficha.ativa:
+                    atualizar_proximo_treino(ficha.aluno)
                 messages.success(request, _("Treino adicionado."))
                 return redirect("treinos:gerenciar_treinos", ficha_id=ficha.pk)
 
@@ -86,10 +109,12 @@ def gerenciar_treinos(request: HttpRequest, ficha_id: int) -> HttpResponse:
 @login_required
 @bloquear_para_aluno
 def remover_treino(request: HttpRequest, treino_id: int) -> HttpResponse:
-    treino = get_object_or_404(Treino, pk=treino_id)
+    treino = get_object_or_404(Treino.objects.select_related("ficha__aluno"), pk=treino_id)
     ficha_id = treino.ficha_id
     if request.method == "POST":
         treino.delete()
+        if treino.ficha.ativa:
+            atualizar_proximo_treino(treino.ficha.aluno)
         messages.success(request, _("Treino removido."))
     return redirect("treinos:gerenciar_treinos", ficha_id=ficha_id)
 
@@ -97,7 +122,7 @@ def remover_treino(request: HttpRequest, treino_id: int) -> HttpResponse:
 @login_required
 @bloquear_para_aluno
 def editar_treino_exercicios(request: HttpRequest, treino_id: int) -> HttpResponse:
-    treino = get_object_or_404(Treino, pk=treino_id)
+    treino = get_object_or_404(Treino.objects.select_related("ficha__aluno"), pk=treino_id)
     formset = TreinoExercicioFormSet(request.POST or None, instance=treino, prefix="exercicios")
 
     if request.method == "POST":
@@ -118,46 +143,77 @@ def editar_treino_exercicios(request: HttpRequest, treino_id: int) -> HttpRespon
 @bloquear_para_aluno
 def ativar_ficha(request: HttpRequest, ficha_id: int) -> HttpResponse:
     ficha = get_object_or_404(FichaTreino, pk=ficha_id)
-    FichaTreino.objects.filter(aluno=ficha.aluno).update(ativa=False)
+    FichaTreino.objects.filter(aluno=ficha.aluno, ativa=True).update(ativa=False)
     ficha.ativa = True
     ficha.save(update_fields=["ativa"])
+    atualizar_proximo_treino(ficha.aluno)
     messages.success(request, _("Ficha marcada como ativa."))
     return redirect("treinos:gerenciar_treinos", ficha_id=ficha.pk)
 
 
+def _renderizar_treino_do_dia(request: HttpRequest, aluno_id: int, versao: list[int], contexto: dict) -> HttpResponse:
+    resposta = render(request, "treino_do_dia.html", contexto)
+    # Guardado depois de renderizar: relacoes carregadas pelo template vao junto.
+    if request.method == "GET":
+        guardar_treino_do_dia(aluno_id, versao, contexto)
+    return resposta
+
+
 @login_required
 def treino_do_dia(request: HttpRequest) -> HttpResponse:
-    aluno = obter_aluno_logado(request.user)
+    # GETs repetidos (o aluno recarrega a pagina entre as series) saem do cache
+    # sem consultar nada alem da sessao e do usuario.
+    if request.method == "GET" and (aluno_id := aluno_id_em_sessao(request)):
+        contexto = ler_treino_do_dia(aluno_id)
+        if contexto is not None:
+            return render(request, "treino_do_dia.html", contexto)
+
+    aluno = request.aluno
     if not aluno:
         mensagens = _("Nenhum treino disponivel para hoje.")
         return render(request, "treino_do_dia.html", {"mensagem": mensagens})
 
-    treino_do_dia = selecionar_treino_do_dia(aluno)
-    if not treino_do_dia:
-        messages.info(request, _("Nenhum treino disponivel para hoje."))
-        return render(request, "treino_do_dia.html", {"mensagem": _("Nenhum treino disponivel para hoje.")})
-
-    treino = TreinoDiario.objects.filter(aluno=aluno, data=date.today()).first()
-    if not treino:
+    treino = (
+        TreinoDiario.objects.filter(aluno=aluno, data=date.today())
+        .select_related("aluno", "treino__ficha__aluno")
+        .first()
+    )
+    if treino and treino.pregerado and treino.treino_id != aluno.proximo_treino_id:
+        # A rotacao mudou depois da geracao noturna; descarta a sessao pre-montada.
+        treino.delete()
+        treino = None
+
+    sessao_nova = treino is None
+    if sessao_nova:
+        treino_do_dia = selecionar_treino_do_dia(aluno)
+        if not treino_do_dia:
+            messages.info(request, _("Nenhum treino disponivel para hoje."))
+            return render(request, "treino_do_dia.html", {"mensagem": _("Nenhum treino disponivel para hoje.")})
+        # O post_save da sessao avanca o ponteiro do aluno.
         treino = TreinoDiario.objects.create(aluno=aluno, treino=treino_do_dia, data=date.today())
-        preparar_progresso(treino)
-
+    elif treino.pregerado:
+        # Sessao montada pelo comando pregerar_treinos: o treino comeca agora.
+        treino.pregerado = False
+        treino.started_at = timezone.now()
+        treino.save(update_fields=["pregerado", "started_at"])
+        avancar_proximo_treino(aluno, treino.treino)
+
+    # Lida depois das escritas acima, que ja invalidaram as versoes anteriores.
+    versao = versao_treino_do_dia(aluno.pk)
     if treino.finalizado:
-        return render(
-            request,
-            "treino_do_dia.html",
-            {
-                "mensagem": _("Treino de hoje ta pago!! 😎"),
-                "treino": treino,
-                "treino_exercicios": treino.treino.exercicios.select_related("exercicio"),
-                "progresso": TreinoProgresso.objects.filter(treino_diario=treino).select_related("exercicio"),
-            },
+        # O template so mostra a mensagem neste caso: nada de listas para consultar.
+        return _renderizar_treino_do_dia(
+            request, aluno.pk, versao, {"mensagem": _("Treino de hoje ta pago!! 😎"), "treino": treino}
         )
 
-    preparar_progresso(treino)
-    progresso_qs = TreinoProgresso.objects.filter(treino_diario=treino).select_related("exercicio")
-    progresso_map = {item.exercicio_id: item for item in progresso_qs}
     treino_exercicios = list(treino.treino.exercicios.select_related("exercicio"))
+    progresso_map = {} if sessao_nova else _mapa_progresso(treino)
+    if preparar_progresso(
+        treino,
+        exercicio_ids=[item.exercicio_id for item in treino_exercicios],
+        existentes=progresso_map,
+    ):
+        progresso_map = _mapa_progresso(treino)
 
     if request.method == "POST":
         selecionados = {int(pk) for pk in request.POST.getlist("exercicios")}
@@ -165,9 +221,8 @@ def treino_do_dia(request: HttpRequest) -> HttpResponse:
 
         try:
             with transaction.atomic():
-                for item in progresso_qs:
-                    item.concluido = item.exercicio_id in selecionados
-                    item.save(update_fields=["concluido"])
+                salvar_progresso(progresso_map, selecionados)
+                invalidar_treino_do_dia(aluno.pk)
                 if acao == "finalizar":
                     agora = timezone.now()
                     total_exercicios = len(treino_exercicios) or 1
@@ -175,7 +230,15 @@ def treino_do_dia(request: HttpRequest) -> HttpResponse:
                     treino.finished_at = agora
                     treino.tempo_total = agora - treino.started_at
                     treino.tempo_medio_exercicio = treino.tempo_total / total_exercicios
-                    treino.save(update_fields=["finalizado", "finished_at", "tempo_total", "tempo_medio_exercicio"])
+                    treino.resumo = montar_resumo(
+                        treino,
+                        treino_exercicios,
+                        [exercicio_id for exercicio_id, item in progresso_map.items() if item.concluido],
+                    )
+                    treino.save(
+                        update_fields=["finalizado", "finished_at", "tempo_total", "tempo_medio_exercicio", "resumo"]
+                    )
+                    registrar_sessao(treino)
                     messages.success(request, _("Treino finalizado com sucesso."))
                     return render(
                         request,
@@ -197,9 +260,10 @@ def treino_do_dia(request: HttpRequest) -> HttpResponse:
 
         messages.success(request, _("Progresso salvo com sucesso."))
 
-    return render(
+    return _renderizar_treino_do_dia(
         request,
-        "treino_do_dia.html",
+        aluno.pk,
+        versao,
         {"treino": treino, "treino_exercicios": treino_exercicios, "progresso": progresso_map},
     )
 
@@ -207,27 +271,27 @@ def treino_do_dia(request: HttpRequest) -> HttpResponse:
 @login_required
 @bloquear_para_aluno
 def lista_treinos(request):
-    aluno = obter_aluno_logado(request.user)
+    aluno = request.aluno
 
-    treinos = TreinoDiario.objects.select_related("aluno", "treino", "treino__ficha").prefetch_related(
-        "treino__exercicios__exercicio"
-    )
-    treinos = treinos.exclude(treino__isnull=True)
+    treinos = TreinoDiario.objects.select_related("aluno", "treino__ficha__aluno")
+    treinos = treinos.filter(treino__isnull=False, pregerado=False)
 
     if aluno:
         treinos = treinos.filter(aluno=aluno)
     else:
         aluno_nome = request.GET.get("aluno", "").strip()
         if aluno_nome:
-            treinos = treinos.filter(Q(aluno__nome__icontains=aluno_nome) | Q(aluno__email__icontains=aluno_nome))
-
-    treinos = treinos.order_by("-data")
+            treinos = treinos.filter(filtro_alunos(aluno_nome, "aluno__"))
 
-    from django.core.paginator import Paginator
-
-    paginator = Paginator(treinos, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    page_obj, _sort_field, _direction = paginar_por_cursor(
+        request,
+        treinos,
+        ("data",),
+        "data",
+        default_direction="desc",
+        per_page=10,
+        contar_ate=1000,
+    )
 
     return render(request, "admin/listar_treinos.html", {"page_obj": page_obj, "aluno_nome": request.GET.get("aluno", "")})
 
@@ -236,43 +300,27 @@ def lista_treinos(request):
 @bloquear_para_aluno
 def lista_fichas(request):
     aluno_id = request.GET.get("aluno")
-    ordenar = request.GET.get("ordenar", "data_criacao")
-    direcao = request.GET.get("direcao", "asc")
     termo = request.GET.get("q", "")
 
-    if ordenar == "aluno":
-        ordem = "aluno__nome" if direcao == "asc" else "-aluno__nome"
-    elif ordenar == "nome":
-        ordem = "nome" if direcao == "asc" else "-nome"
-    else:
-        ordem = ordenar if direcao == "asc" else f"-{ordenar}"
-
     query = Q()
     if aluno_id:
         query &= Q(aluno_id=aluno_id)
 
     if termo:
-        query &= Q(observacoes__icontains=termo) | Q(aluno__nome__icontains=termo)
+        query &= filtro_fichas(termo)
 
-    fichas = (
-        FichaTreino.objects.filter(query)
-        .select_related("aluno")
-        .prefetch_related("treinos__exercicios__exercicio")
-        .order_by(ordem)
-    )
-
-    from django.core.paginator import Paginator
+    fichas = FichaTreino.objects.filter(query).select_related("aluno").prefetch_related("treinos")
 
-    paginator = Paginator(fichas, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-
-    sort_options = {
-        "data_criacao": "desc" if ordenar == "data_criacao" and direcao == "asc" else "asc",
-        "aluno": "desc" if ordenar == "aluno" and direcao == "asc" else "asc",
-        "nome": "desc" if ordenar == "nome" and direcao == "asc" else "asc",
-        "id": "desc" if ordenar == "id" and direcao == "asc" else "asc",
-    }
+    sortable_fields = {"data_criacao": "data_criacao", "aluno": "aluno__nome", "nome": "nome", "id": "id"}
+    page_obj, ordenar, direcao = paginar_por_cursor(
+        request,
+        fichas,
+        sortable_fields,
+        "data_criacao",
+        per_page=10,
+        contar_ate=1000,
+    )
+    sort_options = {field: "desc" if field == ordenar and direcao == "asc" else "asc" for field in sortable_fields}
 
     context = {
         "page_obj": page_obj,
@@ -286,32 +334,100 @@ def lista_fichas(request):
     return render(request, "fichas/listar_fichas.html", context)
 
 
+def _resposta_exportacao(nome: str, linhas, colunas: tuple[str, ...], formato: str) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(
+        exportacao.serializar(linhas, colunas, formato), content_type=exportacao.FORMATOS[formato]
+    )
+    response["Content-Disposition"] = f'attachment; filename="{nome}-{date.today():%Y%m%d}.{formato}"'
+    return response
+
+
+@login_required
+@bloquear_para_aluno
+def exportar_treinos(request: HttpRequest) -> HttpResponse:
+    form = FiltroExportacaoForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    filtros = form.cleaned_data
+
+    treinos = TreinoDiario.objects.filter(treino__isnull=False, pregerado=False)
+    if filtros["aluno_id"]:
+        treinos = treinos.filter(aluno_id=filtros["aluno_id"])
+    if filtros["aluno"]:
+        treinos = treinos.filter(filtro_alunos(filtros["aluno"], "aluno__"))
+    if filtros["ficha"]:
+        treinos = treinos.filter(treino__ficha_id=filtros["ficha"])
+    if filtros["de"]:
+        treinos = treinos.filter(data__gte=filtros["de"])
+    if filtros["ate"]:
+        treinos = treinos.filter(data__lte=filtros["ate"])
+    if filtros["finalizado"] is not None:
+        treinos = treinos.filter(finalizado=filtros["finalizado"])
+
+    return _resposta_exportacao(
+        "treinos", exportacao.linhas_sessoes(treinos), exportacao.COLUNAS_SESSOES, filtros["formato"]
+    )
+
+
+@login_required
+@bloquear_para_aluno
+def exportar_fichas(request: HttpRequest) -> HttpResponse:
+    form = FiltroExportacaoForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    filtros = form.cleaned_data
+
+    fichas = FichaTreino.objects.all()
+    if filtros["aluno_id"]:
+        fichas = fichas.filter(aluno_id=filtros["aluno_id"])
+    if filtros["q"]:
+        fichas = fichas.filter(filtro_fichas(filtros["q"]))
+
+    return _resposta_exportacao(
+        "fichas", exportacao.linhas_fichas(fichas), exportacao.COLUNAS_FICHAS, filtros["formato"]
+    )
+
+
 @login_required
 def historico_treinos(request: HttpRequest) -> HttpResponse:
-    aluno = obter_aluno_logado(request.user)
+    aluno = request.aluno
     if not aluno:
         return render(request, "historico_treinos.html", {"mensagem": _("Nenhum treino encontrado para este aluno.")})
 
-    try:
-        treinos_qs = TreinoDiario.objects.filter(aluno=aluno, finalizado=True, treino__isnull=False).select_related(
-            "treino", "treino__ficha"
+    meses_arquivados = arquivo.meses_arquivados(aluno.pk)
+    mes_arquivado = request.GET.get("arquivo")
+    if mes_arquivado in meses_arquivados:
+        return render(
+            request,
+            "historico_treinos.html",
+            {
+                "meses_arquivados": meses_arquivados,
+                "mes_arquivado": mes_arquivado,
+                "sessoes_arquivadas": arquivo.sessoes_arquivadas(aluno.pk, mes_arquivado),
+            },
         )
+
+    try:
+        # Sessoes finalizadas trazem tudo o que a pagina mostra em `resumo`.
+        treinos_qs = TreinoDiario.objects.filter(aluno=aluno, finalizado=True, treino__isnull=False)
     except Exception:
         messages.error(request, _("Erro ao carregar historico de treinos."))
         return render(request, "historico_treinos.html", {"treinos": []})
 
-    if not treinos_qs.exists():
-        messages.info(request, _("Nenhum treino encontrado para este aluno."))
-
     sortable_fields = ("data", "finalizado")
-    page_obj, sort_field, direction = ordenar_e_paginar(
+    page_obj, sort_field, direction = paginar_por_cursor(
         request,
         treinos_qs,
         sortable_fields,
         "data",
         default_direction="desc",
         per_page=10,
+        contar_ate=1000,
     )
+    if not page_obj and "cursor" not in request.GET:
+        messages.info(request, _("Nenhum treino encontrado para este aluno."))
+    # Historico anterior ao resumo (ate rodar `preencher_resumos`) ainda usa a ficha atual.
+    prefetch_related_objects([treino for treino in page_obj if not treino.resumo], "aluno", "treino__ficha__aluno")
     sort_options = {field: "desc" if field == sort_field and direction == "asc" else "asc" for field in sortable_fields}
 
     return render(
@@ -323,27 +439,21 @@ def historico_treinos(request: HttpRequest) -> HttpResponse:
             "current_sort": sort_field,
             "current_direction": direction,
             "sort_options": sort_options,
+            "meses_arquivados": meses_arquivados,
         },
     )
 
 
 @login_required
 def detalhes_treino(request: HttpRequest, pk: int) -> HttpResponse:
-    aluno = obter_aluno_logado(request.user)
-    treino = get_object_or_404(TreinoDiario.objects.select_related("treino", "treino__ficha", "aluno"), pk=pk)
-    if aluno and treino.aluno != aluno:
+    aluno = request.aluno
+    treino = get_object_or_404(TreinoDiario.objects.select_related("aluno", "treino__ficha__aluno"), pk=pk)
+    if aluno and treino.aluno_id != aluno.pk:
         return redirect("treinos:historico")
 
-    preparar_progresso(treino)
-    progresso_qs = TreinoProgresso.objects.filter(treino_diario=treino).select_related("exercicio")
-    progresso_map = {item.exercicio_id: item for item in progresso_qs}
-    treino_exercicios = treino.treino.exercicios.select_related("exercicio")
-
-    return render(
-        request,
-        "detalhes_treino.html",
-        {"treino": treino, "progresso": progresso_map, "treino_exercicios": treino_exercicios},
-    )
+    # Sessoes sem resumo (em andamento ou anteriores a ele) sao montadas na hora, so com leituras.
+    resumo = treino.resumo or montar_resumo(treino)
+    return render(request, "detalhes_treino.html", {"treino": treino, "resumo": resumo})
 
 
 @login_required
@@ -1,5 +1,9 @@
+import os
+import tempfile
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Base directory
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -26,11 +30,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "treinos.middleware.DesempenhoMiddleware",
+    "treinos.middleware.ConsultasLentasMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "treinos.middleware.AlunoMiddleware",
+    "treinos.middleware.PapeisMiddleware",
+    "treinos.middleware.PerfilamentoMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -39,7 +48,7 @@ ROOT_URLCONF = "gymtrack.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "treinos.desempenho.DjangoTemplatesCronometrados",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -63,6 +72,26 @@ DATABASES = {
     }
 }
 
+# Cache: GYMTRACK_CACHE=locmem (padrao), file ou redis; GYMTRACK_CACHE_LOCATION troca o destino.
+# Os carimbos de versao dos caches em sessao e em memoria moram aqui: com mais de um
+# processo use file ou redis (redis exige o pacote `redis`).
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "gymtrack"),
+    "file": ("django.core.cache.backends.filebased.FileBasedCache", str(Path(tempfile.gettempdir()) / "gymtrack-cache")),
+    "redis": ("django.core.cache.backends.redis.RedisCache", "redis://127.0.0.1:6379/1"),
+}
+GYMTRACK_CACHE = os.environ.get("GYMTRACK_CACHE", "locmem")
+if GYMTRACK_CACHE not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(f"GYMTRACK_CACHE deve ser um de: {', '.join(CACHE_BACKENDS)}.")
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[GYMTRACK_CACHE][0],
+        "LOCATION": os.environ.get("GYMTRACK_CACHE_LOCATION") or CACHE_BACKENDS[GYMTRACK_CACHE][1],
+        "KEY_PREFIX": "gymtrack",
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -95,3 +124,19 @@ LOGIN_URL = "login"
 LOGIN_REDIRECT_URL = "treinos:treino_do_dia"
 LOGOUT_REDIRECT_URL = "login"
 
+# Instrumentacao por requisicao (Server-Timing e agregados em treinos:desempenho)
+GYMTRACK_DESEMPENHO = True
+
+
+# Perfilamento sob demanda (?_perfil=1 por staff); None desliga
+GYMTRACK_PERFIL_DIR = None
+GYMTRACK_PERFIL_MANTER = 20
+GYMTRACK_PERFIL_USUARIOS: list[str] = []
+
+# Diretorio do historico arquivado pelo comando archive_history (lido pelo historico); None desliga
+GYMTRACK_ARQUIVO_DIR = None
+
+# Log JSON lines de consultas lentas (com EXPLAIN) e de provaveis N+1; None desliga
+GYMTRACK_CONSULTAS_LENTAS_LOG = None
+GYMTRACK_CONSULTAS_LENTAS_MS = 100
+GYMTRACK_N_MAIS_UM_LIMITE = 5
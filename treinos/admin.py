@@ -1,6 +1,7 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
-from .models import Aluno, Exercicio, FichaTreino, Treino, TreinoDiario, TreinoExercicio, TreinoProgresso
+from .models import Aluno, Exercicio, FichaTreino, Treino, TreinoDiario, TreinoExercicio, TreinoProgresso, VolumeSemanal
+from .usuarios import sincronizar_usuarios_alunos
 
 
 class TreinoExercicioInline(admin.TabularInline):
@@ -25,6 +26,16 @@ class AlunoAdmin(admin.ModelAdmin):
     list_display = ("nome", "email", "ativo")
     list_filter = ("ativo",)
     search_fields = ("nome", "email")
+    actions = ["sincronizar_usuarios"]
+
+    @admin.action(description="Sincronizar usuarios dos alunos selecionados")
+    def sincronizar_usuarios(self, request, queryset):
+        totais = sincronizar_usuarios_alunos(queryset.iterator(chunk_size=500))
+        self.message_user(
+            request,
+            f"{totais['criados']} usuarios criados e {totais['atualizados']} atualizados.",
+            messages.SUCCESS,
+        )
 
 
 @admin.register(Exercicio)
@@ -51,3 +62,9 @@ class TreinoProgressoAdmin(admin.ModelAdmin):
     list_display = ("treino_diario", "exercicio", "concluido")
     list_filter = ("concluido",)
 
+
+@admin.register(VolumeSemanal)
+class VolumeSemanalAdmin(admin.ModelAdmin):
+    list_display = ("aluno", "semana", "grupo_muscular", "sessoes", "exercicios_concluidos", "volume", "tempo_total")
+    list_filter = ("semana", "grupo_muscular")
+    list_select_related = ("aluno",)
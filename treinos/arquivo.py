@@ -0,0 +1,135 @@
+"""
+Historico arquivado fora do banco (ver o comando `archive_history`).
+
+Cada mes vira `historico-AAAA-MM.jsonl.gz`, uma sessao por linha, escrito
+como uma sequencia de membros gzip (um por aluno em cada lote). O indice
+`historico-AAAA-MM.indice.json` guarda, por aluno, deslocamento, tamanho e
+numero de linhas desses membros: o historico de um aluno descomprime so os
+seus trechos, nao o mes inteiro. O arquivo completo continua sendo um gzip
+valido (`zcat` le todas as linhas).
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import re
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Mapping
+
+from django.conf import settings
+
+from treinos.models import TreinoDiario
+
+PREFIXO = "historico-"
+_MES = re.compile(r"^\d{4}-\d{2}$")
+
+_lock = threading.Lock()
+_indices: dict[Path, tuple[float, dict]] = {}
+
+
+def diretorio() -> Path | None:
+    destino = getattr(settings, "GYMTRACK_ARQUIVO_DIR", None)
+    return Path(destino) if destino else None
+
+
+def arquivo_dados(base: Path, mes: str) -> Path:
+    return base / f"{PREFIXO}{mes}.jsonl.gz"
+
+
+def arquivo_indice(base: Path, mes: str) -> Path:
+    return base / f"{PREFIXO}{mes}.indice.json"
+
+
+def _segundos(duracao: timedelta | None) -> float | None:
+    return None if duracao is None else duracao.total_seconds()
+
+
+def registro(sessao: TreinoDiario, progresso: Mapping[int, bool]) -> dict:
+    """
+    Linha do arquivo de uma sessao: colunas do TreinoDiario, resumo e progresso.
+    """
+    return {
+        "id": sessao.pk,
+        "aluno_id": sessao.aluno_id,
+        "treino_id": sessao.treino_id,
+        "data": sessao.data.isoformat(),
+        "finalizado": sessao.finalizado,
+        "pregerado": sessao.pregerado,
+        "started_at": sessao.started_at.isoformat(),
+        "finished_at": sessao.finished_at.isoformat() if sessao.finished_at else None,
+        "tempo_total": _segundos(sessao.tempo_total),
+        "tempo_medio_exercicio": _segundos(sessao.tempo_medio_exercicio),
+        "resumo": sessao.resumo,
+        "progresso": sorted([exercicio_id, concluido] for exercicio_id, concluido in progresso.items()),
+    }
+
+
+def membro(registros: list[dict]) -> bytes:
+    linhas = "".join(json.dumps(item, ensure_ascii=False, separators=(",", ":")) + "\n" for item in registros)
+    return gzip.compress(linhas.encode("utf-8"), mtime=0)
+
+
+def _ler_indice(caminho: Path) -> dict:
+    """
+    Indices lidos uma vez por processo e relidos quando o arquivo muda.
+    """
+    modificado = caminho.stat().st_mtime
+    with _lock:
+        em_cache = _indices.get(caminho)
+    if em_cache and em_cache[0] == modificado:
+        return em_cache[1]
+    indice = json.loads(caminho.read_text(encoding="utf-8"))
+    with _lock:
+        _indices[caminho] = (modificado, indice)
+    return indice
+
+
+def meses_arquivados(aluno_id: int) -> list[str]:
+    """
+    Meses (AAAA-MM, do mais recente ao mais antigo) com sessoes arquivadas do aluno.
+    """
+    base = diretorio()
+    if base is None or not base.is_dir():
+        return []
+    meses = []
+    for caminho in sorted(base.glob(f"{PREFIXO}*.indice.json"), reverse=True):
+        indice = _ler_indice(caminho)
+        if str(aluno_id) in indice["alunos"]:
+            meses.append(indice["mes"])
+    return meses
+
+
+def sessoes_arquivadas(aluno_id: int, mes: str) -> list[dict]:
+    """
+    Sessoes finalizadas arquivadas do aluno no mes (como no historico ao
+    vivo), da mais recente para a mais antiga, com `data` e tempos
+    convertidos para exibicao. As nao finalizadas ficam so no arquivo.
+    """
+    base = diretorio()
+    if base is None or not _MES.match(mes) or not arquivo_indice(base, mes).exists():
+        return []
+    trechos = _ler_indice(arquivo_indice(base, mes))["alunos"].get(str(aluno_id), [])
+    sessoes = []
+    with open(arquivo_dados(base, mes), "rb") as arquivo:
+        for deslocamento, tamanho, _linhas in trechos:
+            arquivo.seek(deslocamento)
+            for linha in gzip.decompress(arquivo.read(tamanho)).splitlines():
+                item = json.loads(linha)
+                if item["finalizado"]:
+                    sessoes.append(_para_exibicao(item))
+    sessoes.sort(key=lambda sessao: sessao["data"], reverse=True)
+    return sessoes
+
+
+def _para_exibicao(item: dict) -> dict:
+    progresso = item["progresso"]
+    return {
+        **item,
+        "data": date.fromisoformat(item["data"]),
+        "started_at": datetime.fromisoformat(item["started_at"]),
+        "tempo_total": timedelta(seconds=item["tempo_total"]) if item["tempo_total"] is not None else None,
+        "concluidos": sum(1 for _, concluido in progresso if concluido),
+        "total_exercicios": len(progresso),
+    }
@@ -0,0 +1,147 @@
+"""
+Busca textual de alunos e fichas.
+
+No SQLite a busca usa indices FTS5 com o tokenizador `unicode61` removendo
+acentos (Joao encontra Joao e João), mantidos em sincronia por triggers.
+Nos demais bancos, ou se o indice nao existir, cai para LIKE (icontains).
+"""
+from __future__ import annotations
+
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+TABELA_ALUNOS = "treinos_aluno_busca"
+TABELA_FICHAS = "treinos_fichatreino_busca"
+
+ESTRUTURA_SQLITE = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_ALUNOS} USING fts5(
+        nome, email, content='treinos_aluno', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_ALUNOS}_ai AFTER INSERT ON treinos_aluno BEGIN
+        INSERT INTO {TABELA_ALUNOS}(rowid, nome, email) VALUES (new.id, new.nome, new.email);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_ALUNOS}_ad AFTER DELETE ON treinos_aluno BEGIN
+        INSERT INTO {TABELA_ALUNOS}({TABELA_ALUNOS}, rowid, nome, email) VALUES ('delete', old.id, old.nome, old.email);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_ALUNOS}_au AFTER UPDATE OF nome, email ON treinos_aluno BEGIN
+        INSERT INTO {TABELA_ALUNOS}({TABELA_ALUNOS}, rowid, nome, email) VALUES ('delete', old.id, old.nome, old.email);
+        INSERT INTO {TABELA_ALUNOS}(rowid, nome, email) VALUES (new.id, new.nome, new.email);
+    END
+    """,
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FICHAS} USING fts5(
+        nome, motivo, observacoes, content='treinos_fichatreino', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_FICHAS}_ai AFTER INSERT ON treinos_fichatreino BEGIN
+        INSERT INTO {TABELA_FICHAS}(rowid, nome, motivo, observacoes)
+        VALUES (new.id, new.nome, new.motivo, new.observacoes);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_FICHAS}_ad AFTER DELETE ON treinos_fichatreino BEGIN
+        INSERT INTO {TABELA_FICHAS}({TABELA_FICHAS}, rowid, nome, motivo, observacoes)
+        VALUES ('delete', old.id, old.nome, old.motivo, old.observacoes);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_FICHAS}_au AFTER UPDATE OF nome, motivo, observacoes ON treinos_fichatreino BEGIN
+        INSERT INTO {TABELA_FICHAS}({TABELA_FICHAS}, rowid, nome, motivo, observacoes)
+        VALUES ('delete', old.id, old.nome, old.motivo, old.observacoes);
+        INSERT INTO {TABELA_FICHAS}(rowid, nome, motivo, observacoes)
+        VALUES (new.id, new.nome, new.motivo, new.observacoes);
+    END
+    """,
+]
+
+REMOCAO_SQLITE = [
+    f"DROP TABLE IF EXISTS {tabela}" for tabela in (TABELA_ALUNOS, TABELA_FICHAS)
+] + [
+    f"DROP TRIGGER IF EXISTS {tabela}_{sufixo}"
+    for tabela in (TABELA_ALUNOS, TABELA_FICHAS)
+    for sufixo in ("ai", "ad", "au")
+]
+
+_disponivel: dict[str, bool] = {}
+
+
+def busca_disponivel(using: str = "default") -> bool:
+    """
+    Indica se os indices FTS5 existem nesta conexao (verificado uma vez por processo).
+    """
+    if using not in _disponivel:
+        connection = connections[using]
+        _disponivel[using] = connection.vendor == "sqlite" and TABELA_ALUNOS in connection.introspection.table_names()
+    return _disponivel[using]
+
+
+def criar_indices(connection) -> None:
+    """
+    Cria (se preciso) as tabelas FTS5 e os triggers e reconstroi o conteudo.
+    Tambem recria triggers que o SQLite descarta quando o Django refaz uma tabela.
+    """
+    with connection.cursor() as cursor:
+        for sql in ESTRUTURA_SQLITE:
+            cursor.execute(sql)
+        for tabela in (TABELA_ALUNOS, TABELA_FICHAS):
+            cursor.execute(f"INSERT INTO {tabela}({tabela}) VALUES ('rebuild')")
+    _disponivel.pop(connection.alias, None)
+
+
+def remover_indices(connection) -> None:
+    with connection.cursor() as cursor:
+        for sql in REMOCAO_SQLITE:
+            cursor.execute(sql)
+    _disponivel.pop(connection.alias, None)
+
+
+def expressao_fts(termo: str) -> str:
+    """
+    Converte o texto digitado em uma consulta FTS5: cada palavra vira um prefixo
+    e todas precisam aparecer ("joa sil" encontra "João da Silva").
+    """
+    return " ".join(f'"{palavra}"*' for palavra in re.findall(r"\w+", termo))
+
+
+def filtro_alunos(termo: str, prefixo: str = "") -> Q:
+    """
+    Filtro por nome/email do aluno. `prefixo` permite aplicar a busca em
+    modelos relacionados, ex.: `filtro_alunos(termo, "aluno__")` em TreinoDiario.
+    """
+    if busca_disponivel():
+        expressao = expressao_fts(termo)
+        if not expressao:
+            return Q()
+        sql = f"SELECT rowid FROM {TABELA_ALUNOS} WHERE {TABELA_ALUNOS} MATCH %s"
+        return Q(**{f"{prefixo}pk__in": RawSQL(sql, [expressao])})
+    return Q(**{f"{prefixo}nome__icontains": termo}) | Q(**{f"{prefixo}email__icontains": termo})
+
+
+def filtro_fichas(termo: str) -> Q:
+    """
+    Filtro por nome/motivo/observacoes da ficha ou pelo nome/email do aluno.
+    """
+    if busca_disponivel():
+        expressao = expressao_fts(termo)
+        if not expressao:
+            return Q()
+        sql = f"SELECT rowid FROM {TABELA_FICHAS} WHERE {TABELA_FICHAS} MATCH %s"
+        return Q(pk__in=RawSQL(sql, [expressao])) | filtro_alunos(termo, "aluno__")
+    return (
+        Q(nome__icontains=termo)
+        | Q(motivo__icontains=termo)
+        | Q(observacoes__icontains=termo)
+        | filtro_alunos(termo, "aluno__")
+    )
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, TypeVar
+
+from treinos.models import Exercicio
+from treinos.utils import CHAVE_VERSAO_CATALOGO, obter_versao
+
+T = TypeVar("T")
+
+
+class Catalogo:
+    """
+    Foto do catalogo de exercicios numa versao: lista ordenada por nome, mapa
+    id -> exercicio e grupos musculares. Os objetos sao compartilhados entre
+    requisicoes e threads e nao devem ser alterados.
+    """
+
+    def __init__(self, versao: int, exercicios: list[Exercicio]):
+        self.versao = versao
+        self.exercicios = tuple(exercicios)
+        self.por_id = {exercicio.pk: exercicio for exercicio in exercicios}
+        self.grupos_musculares = tuple(sorted({exercicio.grupo_muscular for exercicio in exercicios}))
+        self._derivados: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.exercicios)
+
+    def derivado(self, chave: str, fabrica: Callable[[Catalogo], T]) -> T:
+        """
+        Valor calculado a partir do catalogo (ordenacoes, HTML de options...)
+        guardado junto com esta versao e descartado com ela.
+        """
+        try:
+            return self._derivados[chave]
+        except KeyError:
+            with self._lock:
+                if chave not in self._derivados:
+                    self._derivados[chave] = fabrica(self)
+                return self._derivados[chave]
+
+    def order_by(self, *campos: str) -> list[Exercicio]:
+        """
+        Lista ordenada como `QuerySet.order_by`, para que `ordenar_e_paginar`
+        aceite o catalogo no lugar de `Exercicio.objects.all()`.
+        """
+
+        def ordenar(catalogo: Catalogo) -> list[Exercicio]:
+            ordenados = list(catalogo.exercicios)
+            # Ordenacoes estaveis do ultimo campo para o primeiro.
+            for campo in reversed(campos):
+                nome = campo.lstrip("-")
+                ordenados.sort(key=lambda exercicio: getattr(exercicio, nome), reverse=campo.startswith("-"))
+            return ordenados
+
+        return self.derivado(f"order_by:{','.join(campos)}", ordenar)
+
+
+_lock = threading.Lock()
+_atual: Catalogo | None = None
+
+
+def obter_catalogo() -> Catalogo:
+    """
+    Catalogo em memoria do processo, recarregado quando a versao guardada no
+    cache do Django muda (ver `treinos.signals.invalidar_catalogo_exercicios`).
+    A versao e lida antes da consulta: se o catalogo mudar no meio da carga, a
+    proxima chamada ja encontra uma versao nova e recarrega.
+    """
+    global _atual
+    versao = obter_versao(CHAVE_VERSAO_CATALOGO)
+    atual = _atual
+    if atual is not None and atual.versao == versao:
+        return atual
+    with _lock:
+        if _atual is None or _atual.versao != versao:
+            _atual = Catalogo(versao, list(Exercicio.objects.order_by("nome", "pk")))
+        return _atual
@@ -0,0 +1,65 @@
+"""
+Progresso compactado de sessoes finalizadas.
+
+O comando `compactar_progresso` troca as linhas de TreinoProgresso de uma
+sessao antiga por `TreinoDiario.progresso_compactado`:
+
+    formato (1 byte) | quantidade n (uint16) | n ids de exercicio (uint32, crescentes) | bitset de concluidos
+
+tudo little-endian; o bit i do bitset corresponde ao i-esimo id. Sessoes
+compactadas nao tem mais linhas de TreinoProgresso, entao quem le progresso
+de sessoes passadas deve usar `progresso_das_sessoes`, que entende as duas formas.
+"""
+from __future__ import annotations
+
+import struct
+from typing import Iterable, Mapping
+
+from treinos.models import TreinoDiario, TreinoProgresso
+
+FORMATO = 1
+_CABECALHO = struct.Struct("<BH")
+
+
+def compactar(progresso: Mapping[int, bool]) -> bytes:
+    ids = sorted(progresso)
+    bits = 0
+    for posicao, exercicio_id in enumerate(ids):
+        if progresso[exercicio_id]:
+            bits |= 1 << posicao
+    return (
+        _CABECALHO.pack(FORMATO, len(ids))
+        + struct.pack(f"<{len(ids)}I", *ids)
+        + bits.to_bytes((len(ids) + 7) // 8, "little")
+    )
+
+
+def descompactar(dados: bytes | memoryview) -> dict[int, bool]:
+    dados = bytes(dados)
+    formato, quantidade = _CABECALHO.unpack_from(dados)
+    if formato != FORMATO:
+        raise ValueError(f"Formato de progresso compactado desconhecido: {formato}")
+    ids = struct.unpack_from(f"<{quantidade}I", dados, _CABECALHO.size)
+    bits = int.from_bytes(dados[_CABECALHO.size + 4 * quantidade :], "little")
+    return {exercicio_id: bool(bits >> posicao & 1) for posicao, exercicio_id in enumerate(ids)}
+
+
+def progresso_das_sessoes(sessoes: Iterable[TreinoDiario]) -> dict[int, dict[int, bool]]:
+    """
+    {sessao_id: {exercicio_id: concluido}} de varias sessoes, compactadas ou
+    nao, com no maximo uma consulta (so para as que ainda tem linhas).
+    """
+    progresso: dict[int, dict[int, bool]] = {}
+    com_linhas = []
+    for sessao in sessoes:
+        if sessao.progresso_compactado is not None:
+            progresso[sessao.pk] = descompactar(sessao.progresso_compactado)
+        else:
+            progresso[sessao.pk] = {}
+            com_linhas.append(sessao.pk)
+    if com_linhas:
+        for sessao_id, exercicio_id, concluido in TreinoProgresso.objects.filter(
+            treino_diario_id__in=com_linhas
+        ).values_list("treino_diario_id", "exercicio_id", "concluido"):
+            progresso[sessao_id][exercicio_id] = concluido
+    return progresso
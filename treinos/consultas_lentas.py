@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError
+
+LIMITE_FORMAS_EXPLICADAS = 2000
+QUADROS_NA_PILHA = 5
+# Quadros da propria instrumentacao nao ajudam a achar a origem da consulta.
+MODULOS_IGNORADOS = ("treinos/consultas_lentas.py", "treinos/desempenho.py", "treinos/middleware.py")
+
+_LISTA_PARAMETROS = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+_BASE = str(Path(settings.BASE_DIR).resolve()) + os.sep
+
+
+@dataclass
+class EstadoRequisicao:
+    request: object
+    repeticoes: dict[str, int] = field(default_factory=dict)
+    exemplos: dict[str, tuple[str, list[str]]] = field(default_factory=dict)
+
+
+requisicao_atual: ContextVar[EstadoRequisicao | None] = ContextVar("requisicao_consultas", default=None)
+_explicando: ContextVar[bool] = ContextVar("explicando_consulta", default=False)
+
+_lock = threading.Lock()
+_formas_explicadas: set[str] = set()
+
+
+def configurado() -> bool:
+    return bool(getattr(settings, "GYMTRACK_CONSULTAS_LENTAS_LOG", None))
+
+
+def forma_da_consulta(sql: str) -> str:
+    """
+    SQL normalizado: o Django ja separa os parametros, falta colapsar listas de IN.
+    """
+    return _LISTA_PARAMETROS.sub("(...)", sql)
+
+
+def _identificador(forma: str) -> str:
+    return hashlib.sha1(forma.encode("utf-8")).hexdigest()[:12]
+
+
+def _resumo_pilha() -> list[str]:
+    """
+    Ultimos quadros da pilha dentro do projeto (fora de site-packages e da instrumentacao).
+    """
+    quadros = [
+        f"{quadro.filename.removeprefix(_BASE)}:{quadro.lineno} {quadro.name}"
+        for quadro in traceback.extract_stack()
+        if quadro.filename.startswith(_BASE)
+        and "site-packages" not in quadro.filename
+        and not quadro.filename.endswith(MODULOS_IGNORADOS)
+    ]
+    return quadros[-QUADROS_NA_PILHA:]
+
+
+def _caminho_da_view(match) -> str:
+    # Views de classe chegam como a funcao de `as_view()`; o caminho util e o da classe.
+    view = getattr(match.func, "view_class", match.func)
+    return f"{view.__module__}.{view.__qualname__}"
+
+
+def _origem(estado: EstadoRequisicao | None) -> dict:
+    match = getattr(estado.request, "resolver_match", None) if estado else None
+    return {
+        "rota": match.view_name if match else None,
+        "view": _caminho_da_view(match) if match else None,
+    }
+
+
+def _escrever(entrada: dict) -> None:
+    linha = json.dumps(entrada, ensure_ascii=False, default=str)
+    with _lock, open(settings.GYMTRACK_CONSULTAS_LENTAS_LOG, "a", encoding="utf-8") as arquivo:
+        arquivo.write(linha + "\n")
+
+
+def _plano(connection, sql: str, params) -> list[str] | None:
+    prefixo = connection.ops.explain_query_prefix()
+    token = _explicando.set(True)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefixo} {sql}", params)
+            return [str(linha[-1]) for linha in cursor.fetchall()]
+    except (DatabaseError, NotImplementedError):
+        return None
+    finally:
+        _explicando.reset(token)
+
+
+def _primeira_vez(forma_id: str) -> bool:
+    with _lock:
+        if forma_id in _formas_explicadas:
+            return False
+        if len(_formas_explicadas) >= LIMITE_FORMAS_EXPLICADAS:
+            _formas_explicadas.clear()
+        _formas_explicadas.add(forma_id)
+        return True
+
+
+def registrar_consulta(execute, sql, params, many, context):
+    """
+    Execute wrapper da conexao `default`, instalado por requisicao pelo
+    ConsultasLentasMiddleware: grava consultas acima de
+    GYMTRACK_CONSULTAS_LENTAS_MS e conta formas repetidas por requisicao.
+    """
+    if _explicando.get():
+        return execute(sql, params, many, context)
+
+    inicio = time.perf_counter()
+    resultado = execute(sql, params, many, context)
+    duracao = (time.perf_counter() - inicio) * 1000
+
+    estado = requisicao_atual.get()
+    forma = None
+    if estado is not None:
+        forma = forma_da_consulta(sql)
+        vezes = estado.repeticoes.get(forma, 0) + 1
+        estado.repeticoes[forma] = vezes
+        # A pilha so e guardada quando a forma comeca a se repetir.
+        if vezes == 2:
+            estado.exemplos[forma] = (sql, _resumo_pilha())
+
+    if duracao >= getattr(settings, "GYMTRACK_CONSULTAS_LENTAS_MS", 100):
+        forma = forma or forma_da_consulta(sql)
+        forma_id = _identificador(forma)
+        plano = None
+        if not many and sql.lstrip().upper().startswith("SELECT") and _primeira_vez(forma_id):
+            plano = _plano(context["connection"], sql, params)
+        _escrever(
+            {
+                "tipo": "lenta",
+                "momento": datetime.now().isoformat(timespec="milliseconds"),
+                "duracao_ms": round(duracao, 2),
+                "forma": forma_id,
+                "sql": sql,
+                "params": None if many else params,
+                **_origem(estado),
+                "pilha": _resumo_pilha(),
+                "plano": plano,
+            }
+        )
+    return resultado
+
+
+def finalizar_requisicao(estado: EstadoRequisicao) -> None:
+    """
+    Relata as formas executadas GYMTRACK_N_MAIS_UM_LIMITE vezes ou mais na requisicao.
+    """
+    limite = getattr(settings, "GYMTRACK_N_MAIS_UM_LIMITE", 5)
+    origem = None
+    for forma, vezes in estado.repeticoes.items():
+        if vezes < limite:
+            continue
+        origem = origem or _origem(estado)
+        sql, pilha = estado.exemplos[forma]
+        _escrever(
+            {
+                "tipo": "n_mais_um",
+                "momento": datetime.now().isoformat(timespec="milliseconds"),
+                "repeticoes": vezes,
+                "forma": _identificador(forma),
+                "sql": sql,
+                **origem,
+                "pilha": pilha,
+            }
+        )
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import cProfile
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.template.backends.django import DjangoTemplates, Template
+
+AMOSTRAS_POR_ROTA = 1000
+
+
+@dataclass(slots=True)
+class Medicao:
+    """
+    Tempos acumulados de uma requisicao (em segundos).
+    """
+
+    consultas: int = 0
+    tempo_sql: float = 0.0
+    tempo_template: float = 0.0
+    renderizando: bool = False
+
+
+medicao_atual: ContextVar[Medicao | None] = ContextVar("medicao_atual", default=None)
+
+
+def cronometrar_sql(execute, sql, params, many, context):
+    """
+    Execute wrapper instalado pelo DesempenhoMiddleware em cada conexao.
+    """
+    medicao = medicao_atual.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.tempo_sql += time.perf_counter() - inicio
+        medicao.consultas += 1
+
+
+class TemplateCronometrado(Template):
+    def render(self, context=None, request=None):
+        medicao = medicao_atual.get()
+        # Templates renderizados dentro de outro (inclusion tags, widgets) ja entram no tempo do externo.
+        if medicao is None or medicao.renderizando:
+            return super().render(context, request)
+        medicao.renderizando = True
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicao.tempo_template += time.perf_counter() - inicio
+            medicao.renderizando = False
+
+
+class DjangoTemplatesCronometrados(DjangoTemplates):
+    """
+    Backend DjangoTemplates que soma o tempo de renderizacao na medicao da requisicao.
+    """
+
+    def from_string(self, template_code):
+        return TemplateCronometrado(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TemplateCronometrado(template.template, self)
+
+
+def _percentil(ordenados: list[float], fracao: float) -> float:
+    return ordenados[max(math.ceil(fracao * len(ordenados)) - 1, 0)]
+
+
+class AgregadorDesempenho:
+    """
+    Agregados em memoria por nome de rota. Guarda contagem e maximo totais e as
+    ultimas `amostras` requisicoes para os percentis, que so sao calculados na leitura.
+    Cada processo (worker) tem o seu.
+    """
+
+    def __init__(self, amostras: int = AMOSTRAS_POR_ROTA):
+        self.amostras = amostras
+        self._lock = threading.Lock()
+        self._rotas: dict[str, dict] = {}
+
+    def registrar(self, rota: str, total: float, medicao: Medicao) -> None:
+        with self._lock:
+            dados = self._rotas.get(rota)
+            if dados is None:
+                dados = self._rotas[rota] = {"total": 0, "max": 0.0, "amostras": deque(maxlen=self.amostras)}
+            dados["total"] += 1
+            dados["max"] = max(dados["max"], total)
+            dados["amostras"].append((total, medicao.tempo_sql, medicao.consultas, medicao.tempo_template))
+
+    def resumo(self) -> dict[str, dict]:
+        with self._lock:
+            copia = {rota: (dados["total"], dados["max"], list(dados["amostras"])) for rota, dados in self._rotas.items()}
+
+        resultado = {}
+        for rota, (total, maximo, amostras) in sorted(copia.items()):
+            tempos = sorted(amostra[0] for amostra in amostras)
+            quantidade = len(amostras)
+            resultado[rota] = {
+                "requisicoes": total,
+                "p50_ms": round(_percentil(tempos, 0.50) * 1000, 2),
+                "p95_ms": round(_percentil(tempos, 0.95) * 1000, 2),
+                "p99_ms": round(_percentil(tempos, 0.99) * 1000, 2),
+                "max_ms": round(maximo * 1000, 2),
+                "sql_medio_ms": round(sum(amostra[1] for amostra in amostras) / quantidade * 1000, 2),
+                "consultas_media": round(sum(amostra[2] for amostra in amostras) / quantidade, 1),
+                "template_medio_ms": round(sum(amostra[3] for amostra in amostras) / quantidade * 1000, 2),
+            }
+        return resultado
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._rotas.clear()
+
+
+agregador = AgregadorDesempenho()
+
+
+class AmostradorPilhas(threading.Thread):
+    """
+    Amostra a pilha de uma thread a cada `intervalo` segundos e conta as pilhas
+    no formato colapsado ("a;b;c N") aceito por flamegraph.pl/speedscope.
+    O cProfile nao guarda pilhas completas, por isso o flamegraph sai daqui.
+    """
+
+    def __init__(self, thread_id: int, intervalo: float = 0.001):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.intervalo = intervalo
+        self.pilhas: dict[str, int] = {}
+        self._parar = threading.Event()
+
+    def run(self) -> None:
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.thread_id)
+            pilha = []
+            while frame is not None:
+                codigo = frame.f_code
+                pilha.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                frame = frame.f_back
+            if pilha:
+                chave = ";".join(reversed(pilha))
+                self.pilhas[chave] = self.pilhas.get(chave, 0) + 1
+
+    def parar(self) -> list[str]:
+        self._parar.set()
+        self.join()
+        return [f"{pilha} {quantidade}" for pilha, quantidade in sorted(self.pilhas.items())]
+
+
+class Perfilador:
+    """
+    Roda uma requisicao sob cProfile e grava `.prof` (pstats) e `.collapsed`
+    (pilhas amostradas, para flamegraph) no diretorio configurado, mantendo
+    apenas os `manter` mais recentes.
+    Um perfil por vez por processo: o cProfile nao aceita dois perfis ativos.
+    """
+
+    def __init__(self, diretorio: str | os.PathLike, manter: int):
+        self.diretorio = Path(diretorio)
+        self.manter = manter
+        self._lock = threading.Lock()
+
+    def executar(self, funcao, request):
+        if not self._lock.acquire(blocking=False):
+            return funcao(request), None
+        amostrador = AmostradorPilhas(threading.get_ident())
+        try:
+            perfil = cProfile.Profile()
+            amostrador.start()
+            response = perfil.runcall(funcao, request)
+        finally:
+            pilhas = amostrador.parar()
+            self._lock.release()
+        match = request.resolver_match
+        rota = (match.view_name if match else "nao_resolvida").replace(":", "-")
+        nome = f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 1_000_000:06d}-{rota}-{request.user.get_username()}"
+        self._gravar(perfil, pilhas, nome)
+        return response, nome
+
+    def _gravar(self, perfil: cProfile.Profile, pilhas: list[str], nome: str) -> None:
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        perfil.dump_stats(self.diretorio / f"{nome}.prof")
+        (self.diretorio / f"{nome}.collapsed").write_text("\n".join(pilhas) + "\n", encoding="utf-8")
+        antigos = sorted(self.diretorio.glob("*.prof"), key=lambda caminho: caminho.stat().st_mtime, reverse=True)
+        for caminho in antigos[self.manter :]:
+            caminho.unlink(missing_ok=True)
+            caminho.with_suffix(".collapsed").unlink(missing_ok=True)
@@ -0,0 +1,147 @@
+"""
+Exportacao em streaming (CSV ou JSON lines) de sessoes e fichas.
+
+As linhas saem de projecoes `values_list(...).iterator()` em ordem de pk:
+nenhum objeto de modelo e criado por linha e a memoria fica limitada a um
+lote, seja qual for o tamanho da exportacao. O progresso de cada sessao
+vem do resumo gravado ao finalizar, do progresso compactado ou, para as
+demais, de uma unica consulta agregada por lote; os nomes de aluno, ficha e
+treino das sessoes com resumo tambem vem dele, como no historico.
+"""
+from __future__ import annotations
+
+import csv
+import json
+from datetime import timedelta
+from typing import Iterable, Iterator
+
+from django.db.models import Count, Q, QuerySet
+
+from treinos.compactacao import descompactar
+from treinos.models import FichaTreino, TreinoDiario, TreinoProgresso
+from treinos.utils import em_lotes
+
+TAMANHO_LOTE = 2000
+
+FORMATOS = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson; charset=utf-8"}
+
+COLUNAS_SESSOES = (
+    "id",
+    "data",
+    "aluno_id",
+    "aluno",
+    "ficha_id",
+    "ficha",
+    "treino",
+    "finalizado",
+    "started_at",
+    "finished_at",
+    "tempo_total",
+    "concluidos",
+    "total_exercicios",
+)
+
+COLUNAS_FICHAS = ("id", "nome", "motivo", "aluno_id", "aluno", "data_criacao", "ativa", "treinos")
+
+
+class _Eco:
+    """
+    "Arquivo" cujo write devolve o texto, para o csv.writer alimentar um gerador.
+    """
+
+    def write(self, valor: str) -> str:
+        return valor
+
+
+def _segundos(duracao: timedelta | None) -> int | None:
+    return None if duracao is None else int(duracao.total_seconds())
+
+
+def _progresso_do_lote(linhas: list[tuple]) -> dict[int, tuple[int, int]]:
+    """
+    {sessao_id: (concluidos, total)} do lote, com no maximo uma consulta.
+    """
+    progresso: dict[int, tuple[int, int]] = {}
+    com_linhas = []
+    for sessao_id, resumo, compactado in linhas:
+        if resumo:
+            exercicios = resumo["exercicios"]
+            progresso[sessao_id] = (sum(1 for item in exercicios if item["concluido"]), len(exercicios))
+        elif compactado is not None:
+            marcados = descompactar(compactado)
+            progresso[sessao_id] = (sum(marcados.values()), len(marcados))
+        else:
+            com_linhas.append(sessao_id)
+    if com_linhas:
+        agregados = (
+            TreinoProgresso.objects.filter(treino_diario_id__in=com_linhas)
+            .values_list("treino_diario_id")
+            .annotate(concluidos=Count("pk", filter=Q(concluido=True)), total=Count("pk"))
+            .order_by()
+        )
+        for sessao_id, concluidos, total in agregados:
+            progresso[sessao_id] = (concluidos, total)
+    return progresso
+
+
+def linhas_sessoes(sessoes: QuerySet[TreinoDiario]) -> Iterator[tuple]:
+    campos = (
+        "pk",
+        "data",
+        "aluno_id",
+        "aluno__nome",
+        "treino__ficha_id",
+        "treino__ficha__nome",
+        "treino__nome",
+        "finalizado",
+        "started_at",
+        "finished_at",
+        "tempo_total",
+        "resumo",
+        "progresso_compactado",
+    )
+    projecao = sessoes.order_by("pk").values_list(*campos).iterator(chunk_size=TAMANHO_LOTE)
+    for lote in em_lotes(projecao, TAMANHO_LOTE):
+        progresso = _progresso_do_lote([(linha[0], linha[11], linha[12]) for linha in lote])
+        for linha in lote:
+            concluidos, total = progresso.get(linha[0], (0, 0))
+            resumo = linha[11]
+            # Como no historico: sessoes com resumo usam os nomes da foto gravada ao finalizar,
+            # nao os atuais (a ficha ou o treino podem ter sido renomeados depois).
+            nomes = (resumo["aluno"], linha[4], resumo["ficha"], resumo["treino"]) if resumo else linha[3:7]
+            yield (
+                *linha[:3],
+                *nomes,
+                linha[7],
+                linha[8].isoformat(),
+                linha[9].isoformat() if linha[9] else None,
+                _segundos(linha[10]),
+                concluidos,
+                total,
+            )
+
+
+def linhas_fichas(fichas: QuerySet[FichaTreino]) -> Iterator[tuple]:
+    projecao = (
+        fichas.order_by("pk")
+        .annotate(quantidade_treinos=Count("treinos"))
+        .values_list("pk", "nome", "motivo", "aluno_id", "aluno__nome", "data_criacao", "ativa", "quantidade_treinos")
+    )
+    return projecao.iterator(chunk_size=TAMANHO_LOTE)
+
+
+def serializar(linhas: Iterable[tuple], colunas: tuple[str, ...], formato: str) -> Iterator[str]:
+    """
+    Texto da exportacao em blocos de ate TAMANHO_LOTE linhas.
+    """
+    if formato == "csv":
+        escritor = csv.writer(_Eco())
+        yield "\ufeff" + escritor.writerow(colunas)
+        for lote in em_lotes(linhas, TAMANHO_LOTE):
+            yield "".join(escritor.writerow(linha) for linha in lote)
+        return
+    for lote in em_lotes(linhas, TAMANHO_LOTE):
+        yield "".join(
+            json.dumps(dict(zip(colunas, linha)), ensure_ascii=False, default=str, separators=(",", ":")) + "\n"
+            for linha in lote
+        )
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import time
+from datetime import date
+from itertools import groupby
+from operator import attrgetter
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from treinos import arquivo
+from treinos.compactacao import progresso_das_sessoes
+from treinos.models import TreinoDiario
+from treinos.utils import em_lotes, montar_resumos
+
+CHECKPOINT = "archive_history.checkpoint.json"
+
+
+def _limites_do_mes(mes: str) -> tuple[date, date]:
+    ano, numero = map(int, mes.split("-"))
+    inicio = date(ano, numero, 1)
+    fim = date(ano + 1, 1, 1) if numero == 12 else date(ano, numero + 1, 1)
+    return inicio, fim
+
+
+class Command(BaseCommand):
+    help = (
+        "Arquiva o historico antigo (TreinoDiario e progresso) em arquivos JSONL comprimidos, um por mes, "
+        "confere as contagens e so entao apaga as sessoes do banco em lotes. Um checkpoint no diretorio "
+        "de destino permite retomar uma execucao interrompida."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--meses",
+            type=int,
+            default=12,
+            help="Meses completos mantidos no banco alem do atual (padrao: 12).",
+        )
+        parser.add_argument("--destino", help="Diretorio dos arquivos (padrao: GYMTRACK_ARQUIVO_DIR).")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Sessoes por lote de leitura e de exclusao.")
+        parser.add_argument("--dry-run", action="store_true", help="So lista os meses e sessoes que seriam arquivados.")
+        parser.add_argument("--vacuum", action="store_true", help="Roda VACUUM no fim (SQLite), devolvendo o espaco.")
+
+    def handle(self, *args, **options):
+        self.tamanho = options["chunk_size"]
+        if self.tamanho < 1 or options["meses"] < 0:
+            raise CommandError("--chunk-size deve ser positivo e --meses nao pode ser negativo.")
+        base = Path(options["destino"]) if options["destino"] else arquivo.diretorio()
+        if base is None:
+            raise CommandError("Informe --destino ou configure GYMTRACK_ARQUIVO_DIR.")
+
+        hoje = date.today()
+        meses_atras = hoje.year * 12 + hoje.month - 1 - options["meses"]
+        corte = date(meses_atras // 12, meses_atras % 12 + 1, 1)
+        meses = [dia.strftime("%Y-%m") for dia in TreinoDiario.objects.filter(data__lt=corte).dates("data", "month")]
+
+        if options["dry_run"]:
+            for mes in meses:
+                inicio, fim = _limites_do_mes(mes)
+                total = TreinoDiario.objects.filter(data__gte=inicio, data__lt=fim).count()
+                self.stdout.write(f"  {mes}: {total} sessoes")
+            self.stdout.write(f"{len(meses)} meses anteriores a {corte:%m/%Y} seriam arquivados em {base}.")
+            return
+
+        base.mkdir(parents=True, exist_ok=True)
+        self.base = base
+        checkpoint = self._ler_checkpoint()
+        if checkpoint and checkpoint["mes"] not in meses:
+            # O mes do checkpoint ja saiu do banco; so faltou limpar o arquivo.
+            checkpoint = None
+            self._gravar_checkpoint(None)
+
+        inicio = time.perf_counter()
+        for mes in meses:
+            retomado = checkpoint if checkpoint and checkpoint["mes"] == mes else None
+            if retomado:
+                self.stdout.write(f"Retomando {mes} ({retomado['fase']}, {retomado['linhas']} sessoes ja escritas).")
+            self._arquivar_mes(mes, retomado)
+
+        if options["vacuum"] and connection.vendor == "sqlite":
+            self.stdout.write("Executando VACUUM...")
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(meses)} meses arquivados em {base} ({time.perf_counter() - inicio:.1f}s).")
+        )
+
+    # Checkpoint -----------------------------------------------------------
+
+    def _ler_checkpoint(self) -> dict | None:
+        caminho = self.base / CHECKPOINT
+        if not caminho.exists():
+            return None
+        return json.loads(caminho.read_text(encoding="utf-8"))
+
+    def _gravar_checkpoint(self, estado: dict | None) -> None:
+        caminho = self.base / CHECKPOINT
+        if estado is None:
+            caminho.unlink(missing_ok=True)
+            return
+        temporario = caminho.with_suffix(".tmp")
+        temporario.write_text(json.dumps(estado), encoding="utf-8")
+        os.replace(temporario, caminho)
+
+    # Arquivamento ---------------------------------------------------------
+
+    def _arquivar_mes(self, mes: str, estado: dict | None) -> None:
+        inicio, fim = _limites_do_mes(mes)
+        sessoes = TreinoDiario.objects.filter(data__gte=inicio, data__lt=fim)
+        if arquivo.arquivo_indice(self.base, mes).exists():
+            (self.base / f"{arquivo.PREFIXO}{mes}.indice.parcial").unlink(missing_ok=True)
+        else:
+            self._exportar(mes, sessoes, estado)
+        arquivados = self._ids_arquivados(mes)
+        self._excluir(mes, sessoes, arquivados)
+
+    def _exportar(self, mes: str, sessoes, estado: dict | None) -> None:
+        """
+        Escreve o mes em lotes ordenados por (aluno, pk), um membro gzip por
+        aluno em cada lote, e grava o checkpoint depois de cada lote ja no disco.
+        """
+        dados = arquivo.arquivo_dados(self.base, mes)
+        parcial = self.base / f"{arquivo.PREFIXO}{mes}.indice.parcial"
+        if estado is None or estado["fase"] != "exportando":
+            estado = {
+                "mes": mes,
+                "fase": "exportando",
+                "ultimo": None,
+                "bytes_dados": 0,
+                "bytes_indice": 0,
+                "linhas": 0,
+            }
+
+        with open(dados, "r+b" if dados.exists() else "wb") as saida, open(
+            parcial, "r+b" if parcial.exists() else "wb"
+        ) as indice:
+            # Descarta o que foi escrito depois do ultimo checkpoint.
+            saida.truncate(estado["bytes_dados"])
+            saida.seek(estado["bytes_dados"])
+            indice.truncate(estado["bytes_indice"])
+            indice.seek(estado["bytes_indice"])
+
+            while True:
+                pendentes = sessoes
+                if estado["ultimo"]:
+                    aluno_id, pk = estado["ultimo"]
+                    pendentes = pendentes.filter(Q(aluno_id__gt=aluno_id) | Q(aluno_id=aluno_id, pk__gt=pk))
+                lote = list(
+                    pendentes.select_related("aluno", "treino__ficha__aluno").order_by("aluno_id", "pk")[: self.tamanho]
+                )
+                if not lote:
+                    break
+                montar_resumos([sessao for sessao in lote if sessao.finalizado and not sessao.resumo])
+                progresso = progresso_das_sessoes(lote)
+
+                for aluno_id, grupo in groupby(lote, key=attrgetter("aluno_id")):
+                    grupo = list(grupo)
+                    bloco = arquivo.membro([arquivo.registro(sessao, progresso[sessao.pk]) for sessao in grupo])
+                    indice.write(json.dumps([aluno_id, saida.tell(), len(bloco), len(grupo)]).encode() + b"\n")
+                    saida.write(bloco)
+                for arquivo_aberto in (saida, indice):
+                    arquivo_aberto.flush()
+                    os.fsync(arquivo_aberto.fileno())
+
+                estado.update(
+                    ultimo=[lote[-1].aluno_id, lote[-1].pk],
+                    bytes_dados=saida.tell(),
+                    bytes_indice=indice.tell(),
+                    linhas=estado["linhas"] + len(lote),
+                )
+                self._gravar_checkpoint(estado)
+                self.stdout.write(f"  {mes}: {estado['linhas']} sessoes escritas")
+
+        esperado = sessoes.count()
+        if estado["linhas"] != esperado:
+            raise CommandError(
+                f"{mes}: {estado['linhas']} sessoes escritas, mas o banco tem {esperado}. "
+                f"Nada foi apagado; remova {dados.name} e {CHECKPOINT} e rode de novo."
+            )
+
+        alunos: dict[str, list] = {}
+        with open(parcial, encoding="utf-8") as indice:
+            for linha in indice:
+                aluno_id, deslocamento, tamanho, linhas = json.loads(linha)
+                alunos.setdefault(str(aluno_id), []).append([deslocamento, tamanho, linhas])
+        caminho_indice = arquivo.arquivo_indice(self.base, mes)
+        temporario = caminho_indice.with_suffix(".tmp")
+        temporario.write_text(json.dumps({"mes": mes, "sessoes": estado["linhas"], "alunos": alunos}), encoding="utf-8")
+        os.replace(temporario, caminho_indice)
+        parcial.unlink()
+
+        self._gravar_checkpoint({"mes": mes, "fase": "excluindo", "linhas": estado["linhas"]})
+
+    def _ids_arquivados(self, mes: str) -> set[int]:
+        """
+        Rele o arquivo inteiro e confere o total de linhas com o indice.
+        """
+        indice = json.loads(arquivo.arquivo_indice(self.base, mes).read_text(encoding="utf-8"))
+        ids = set()
+        with gzip.open(arquivo.arquivo_dados(self.base, mes), "rt", encoding="utf-8") as entrada:
+            for linha in entrada:
+                ids.add(json.loads(linha)["id"])
+        if len(ids) != indice["sessoes"]:
+            raise CommandError(
+                f"{mes}: o arquivo tem {len(ids)} sessoes e o indice {indice['sessoes']}. Nada foi apagado."
+            )
+        return ids
+
+    def _excluir(self, mes: str, sessoes, arquivados: set[int]) -> None:
+        restantes = list(sessoes.order_by("pk").values_list("pk", flat=True))
+        fora_do_arquivo = set(restantes) - arquivados
+        if fora_do_arquivo:
+            raise CommandError(
+                f"{mes}: {len(fora_do_arquivo)} sessoes no banco nao estao no arquivo (criadas depois da "
+                f"exportacao?). Nada foi apagado; remova os arquivos do mes e rode de novo."
+            )
+        self._gravar_checkpoint({"mes": mes, "fase": "excluindo", "linhas": len(arquivados)})
+        apagadas = 0
+        for lote in em_lotes(restantes, self.tamanho):
+            with transaction.atomic():
+                TreinoDiario.objects.filter(pk__in=lote).delete()
+            apagadas += len(lote)
+        self._gravar_checkpoint(None)
+        self.stdout.write(f"  {mes}: {len(arquivados)} sessoes arquivadas, {apagadas} apagadas do banco")
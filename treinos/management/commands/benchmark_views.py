@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import json
+import math
+import time
+from collections.abc import Callable
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from treinos.models import Aluno, TreinoDiario, TreinoExercicio
+
+User = get_user_model()
+
+ORCAMENTOS_PADRAO = Path(__file__).resolve().parents[2] / "benchmarks" / "orcamentos.json"
+FOLGA_TEMPO = 1.5
+
+
+def _percentil(valores: list[float], fracao: float) -> float:
+    ordenados = sorted(valores)
+    posicao = max(math.ceil(fracao * len(ordenados)) - 1, 0)
+    return ordenados[posicao]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede cada view de treinos.urls com o client de teste sobre a base atual (gerada com seed_gymtrack), "
+        "registra percentis de tempo e numero de consultas SQL e compara com os orcamentos versionados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeticoes", type=int, default=20, help="Execucoes medidas por view.")
+        parser.add_argument("--aquecimento", type=int, default=2, help="Execucoes descartadas antes da medicao.")
+        parser.add_argument("--orcamentos", default=str(ORCAMENTOS_PADRAO), help="Arquivo JSON com os orcamentos.")
+        parser.add_argument("--saida", help="Grava o resultado em JSON neste arquivo (padrao: so imprime).")
+        parser.add_argument(
+            "--atualizar-orcamentos",
+            action="store_true",
+            help="Regrava o arquivo de orcamentos a partir desta execucao em vez de comparar.",
+        )
+        parser.add_argument("--view", action="append", dest="views", help="Mede so as views informadas (repetivel).")
+
+    def handle(self, *args, **options):
+        repeticoes = options["repeticoes"]
+        if repeticoes < 1:
+            raise CommandError("--repeticoes deve ser positivo.")
+
+        resultados: dict[str, dict] = {}
+        # Tudo roda dentro de uma transacao desfeita no fim: os POSTs nao alteram a base medida.
+        # O cache tambem e isolado, para nao guardar contextos de dados que serao desfeitos.
+        with transaction.atomic(), override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "benchmark"}},
+        ):
+            cenarios = self._montar_cenarios()
+            selecionados = options["views"] or list(cenarios)
+            desconhecidos = set(selecionados) - set(cenarios)
+            if desconhecidos:
+                raise CommandError(f"Views desconhecidas: {', '.join(sorted(desconhecidos))}")
+
+            for nome in selecionados:
+                resultados[nome] = self._medir(cenarios[nome], repeticoes, options["aquecimento"])
+                medida = resultados[nome]
+                self.stdout.write(
+                    f"{nome:32s} consultas={medida['consultas']:<4d} p50={medida['p50_ms']:8.1f}ms "
+                    f"p95={medida['p95_ms']:8.1f}ms max={medida['max_ms']:8.1f}ms"
+                )
+            transaction.set_rollback(True)
+
+        relatorio = {
+            "gerado_em": datetime.now().isoformat(timespec="seconds"),
+            "banco": connection.vendor,
+            "volume": {
+                "alunos": Aluno.objects.count(),
+                "treinos_diarios": TreinoDiario.objects.count(),
+            },
+            "repeticoes": repeticoes,
+            "views": resultados,
+        }
+        if options["saida"]:
+            Path(options["saida"]).write_text(json.dumps(relatorio, indent=2) + "\n", encoding="utf-8")
+            self.stdout.write(f"Resultado gravado em {options['saida']}.")
+
+        caminho = Path(options["orcamentos"])
+        if options["atualizar_orcamentos"]:
+            self._gravar_orcamentos(caminho, resultados)
+            self.stdout.write(self.style.SUCCESS(f"Orcamentos atualizados em {caminho}."))
+            return
+
+        violacoes = self._comparar(caminho, resultados)
+        if violacoes:
+            raise CommandError("Orcamento estourado:\n  " + "\n  ".join(violacoes))
+        self.stdout.write(self.style.SUCCESS(f"{len(resultados)} views dentro do orcamento."))
+
+    def _montar_cenarios(self) -> dict[str, Callable[[], object]]:
+        """
+        Escolhe o aluno com mais historico (e ficha ativa) e monta uma chamada por view.
+        """
+        aluno = (
+            Aluno.objects.filter(usuario__isnull=False, fichas__ativa=True, proximo_treino__isnull=False)
+            .annotate(sessoes=Count("treinos_diarios"))
+            .order_by("-sessoes", "pk")
+            .select_related("usuario")
+            .first()
+        )
+        if aluno is None:
+            raise CommandError("Nenhum aluno com ficha ativa. Gere dados com `manage.py seed_gymtrack` antes.")
+        sessao = TreinoDiario.objects.filter(aluno=aluno, finalizado=True).order_by("-data").first()
+        if sessao is None:
+            raise CommandError("O aluno escolhido nao possui historico finalizado.")
+        exercicios = list(
+            TreinoExercicio.objects.filter(treino_id=aluno.proximo_treino_id).values_list("exercicio_id", flat=True)
+        )
+
+        instrutor = User.objects.create_user(username="_benchmark_instrutor", password=None, is_staff=True)
+        cliente_instrutor = Client()
+        cliente_instrutor.force_login(instrutor)
+        cliente_aluno = Client()
+        cliente_aluno.force_login(aluno.usuario)
+
+        def get(cliente: Client, url: str) -> Callable[[], object]:
+            return lambda: cliente.get(url)
+
+        return {
+            "lista_alunos": get(cliente_instrutor, reverse("treinos:lista_alunos")),
+            "lista_fichas": get(cliente_instrutor, reverse("treinos:lista_fichas")),
+            "lista_treinos": get(cliente_instrutor, reverse("treinos:lista_treinos")),
+            "editar_treino_exercicios": get(
+                cliente_instrutor, reverse("treinos:editar_treino_exercicios", args=[aluno.proximo_treino_id])
+            ),
+            "treino_do_dia GET": get(cliente_aluno, reverse("treinos:treino_do_dia")),
+            "treino_do_dia POST": lambda: cliente_aluno.post(
+                reverse("treinos:treino_do_dia"), {"exercicios": exercicios[: len(exercicios) // 2], "acao": "salvar"}
+            ),
+            "historico": get(cliente_aluno, reverse("treinos:historico")),
+            "detalhes_treino": get(cliente_aluno, reverse("treinos:detalhes_treino", args=[sessao.pk])),
+            "progresso": get(cliente_aluno, reverse("treinos:progresso")),
+            "volume_semanal": get(cliente_instrutor, reverse("treinos:volume_semanal")),
+        }
+
+    def _medir(self, executar: Callable[[], object], repeticoes: int, aquecimento: int) -> dict:
+        for _ in range(aquecimento):
+            self._checar_resposta(executar())
+
+        tempos: list[float] = []
+        consultas = 0
+        for _ in range(repeticoes):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                resposta = executar()
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            self._checar_resposta(resposta)
+            consultas = max(consultas, len(capturadas))
+        return {
+            "consultas": consultas,
+            "p50_ms": round(_percentil(tempos, 0.50), 2),
+            "p95_ms": round(_percentil(tempos, 0.95), 2),
+            "max_ms": round(max(tempos), 2),
+        }
+
+    def _checar_resposta(self, resposta) -> None:
+        if resposta.status_code >= 400:
+            raise CommandError(f"{resposta.request['PATH_INFO']} respondeu {resposta.status_code}.")
+
+    def _comparar(self, caminho: Path, resultados: dict[str, dict]) -> list[str]:
+        try:
+            orcamentos = json.loads(caminho.read_text(encoding="utf-8"))
+        except FileNotFoundError as exc:
+            raise CommandError(f"Arquivo de orcamentos nao encontrado: {caminho}") from exc
+
+        violacoes = []
+        for nome, medida in resultados.items():
+            orcamento = orcamentos.get(nome)
+            if orcamento is None:
+                violacoes.append(f"{nome}: sem orcamento definido em {caminho.name}")
+                continue
+            if medida["consultas"] > orcamento["consultas"]:
+                violacoes.append(f"{nome}: {medida['consultas']} consultas (orcamento {orcamento['consultas']})")
+            if medida["p95_ms"] > orcamento["p95_ms"]:
+                violacoes.append(f"{nome}: p95 de {medida['p95_ms']:.1f}ms (orcamento {orcamento['p95_ms']:.1f}ms)")
+        return violacoes
+
+    def _gravar_orcamentos(self, caminho: Path, resultados: dict[str, dict]) -> None:
+        """
+        Consultas sao deterministicas e viram teto exato; o tempo ganha folga por variar entre maquinas.
+        """
+        orcamentos = json.loads(caminho.read_text(encoding="utf-8")) if caminho.exists() else {}
+        for nome, medida in resultados.items():
+            orcamentos[nome] = {
+                "consultas": medida["consultas"],
+                "p95_ms": round(max(medida["p95_ms"] * FOLGA_TEMPO, 50.0), 1),
+            }
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        caminho.write_text(json.dumps(orcamentos, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from treinos.compactacao import compactar
+from treinos.models import TreinoDiario, TreinoProgresso
+
+
+class Command(BaseCommand):
+    help = (
+        "Compacta o progresso de sessoes finalizadas: grava TreinoDiario.progresso_compactado (ids dos "
+        "exercicios + bitset de concluidos) e apaga as linhas de TreinoProgresso da sessao, em lotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dias",
+            type=int,
+            default=30,
+            help="So compacta sessoes com mais de N dias (padrao: 30; minimo 1, a de hoje nunca e compactada).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Sessoes por transacao.")
+        parser.add_argument("--dry-run", action="store_true", help="So conta o que seria compactado.")
+
+    def handle(self, *args, **options):
+        tamanho = options["chunk_size"]
+        if tamanho < 1 or options["dias"] < 1:
+            raise CommandError("--chunk-size e --dias devem ser positivos.")
+        limite = date.today() - timedelta(days=options["dias"])
+        sessoes = TreinoDiario.objects.filter(finalizado=True, data__lt=limite, progresso_compactado__isnull=True)
+
+        if options["dry_run"]:
+            linhas = TreinoProgresso.objects.filter(treino_diario__in=sessoes).count()
+            self.stdout.write(f"{sessoes.count()} sessoes ({linhas} linhas de progresso) seriam compactadas.")
+            return
+
+        inicio = time.perf_counter()
+        compactadas = apagadas = 0
+        ultimo_pk = 0
+        while True:
+            ids = list(sessoes.filter(pk__gt=ultimo_pk).order_by("pk").values_list("pk", flat=True)[:tamanho])
+            if not ids:
+                break
+            ultimo_pk = ids[-1]
+            apagadas += self._compactar_lote(ids)
+            compactadas += len(ids)
+            decorrido = time.perf_counter() - inicio
+            self.stdout.write(f"  {compactadas} sessoes, {apagadas} linhas apagadas ({compactadas / decorrido:.0f}/s)")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{compactadas} sessoes compactadas e {apagadas} linhas de progresso apagadas "
+                f"em {time.perf_counter() - inicio:.1f}s."
+            )
+        )
+
+    def _compactar_lote(self, ids: list[int]) -> int:
+        with transaction.atomic():
+            progresso: dict[int, dict[int, bool]] = defaultdict(dict)
+            for sessao_id, exercicio_id, concluido in TreinoProgresso.objects.filter(
+                treino_diario_id__in=ids
+            ).values_list("treino_diario_id", "exercicio_id", "concluido"):
+                progresso[sessao_id][exercicio_id] = concluido
+            TreinoDiario.objects.bulk_update(
+                [TreinoDiario(pk=sessao_id, progresso_compactado=compactar(progresso[sessao_id])) for sessao_id in ids],
+                ["progresso_compactado"],
+            )
+            # Sem receptores de sinal em TreinoProgresso, o delete e um unico DELETE ... WHERE IN.
+            apagadas, _ = TreinoProgresso.objects.filter(treino_diario_id__in=ids).delete()
+        return apagadas
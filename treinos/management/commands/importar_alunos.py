@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from alunos.importacao import importar_alunos, ler_registros
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa alunos de um CSV (nome,email,data_nascimento[,ativo]) ou JSON, criando usuarios e o vinculo "
+        "ao grupo 'aluno' em lotes, sem o custo por linha do sinal de criacao."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("arquivo", help="Caminho do arquivo .csv ou .json.")
+        parser.add_argument("--formato", choices=("csv", "json"), help="Padrao: deduzido pela extensao.")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Alunos por transacao.")
+        parser.add_argument(
+            "--ignorar-invalidos",
+            action="store_true",
+            help="Importa as linhas validas mesmo que outras tenham erro.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="So valida o arquivo.")
+
+    def handle(self, *args, **options):
+        caminho = Path(options["arquivo"])
+        formato = options["formato"] or caminho.suffix.lstrip(".").lower()
+        try:
+            registros = ler_registros(caminho.read_bytes(), formato)
+        except (OSError, ValueError, UnicodeDecodeError) as exc:
+            raise CommandError(f"Nao foi possivel ler {caminho}: {exc}") from exc
+
+        inicio = time.perf_counter()
+        resultado = importar_alunos(
+            registros,
+            chunk_size=options["chunk_size"],
+            ignorar_invalidos=options["ignorar_invalidos"],
+            dry_run=options["dry_run"],
+        )
+        decorrido = time.perf_counter() - inicio
+
+        for numero, mensagens in resultado.erros:
+            self.stderr.write(f"Linha {numero}: {'; '.join(mensagens)}")
+        if resultado.erros and not options["ignorar_invalidos"] and not options["dry_run"]:
+            raise CommandError(
+                f"{len(resultado.erros)} de {resultado.linhas} linhas com erro; nada foi importado "
+                "(use --ignorar-invalidos para importar as validas)."
+            )
+        if options["dry_run"]:
+            self.stdout.write(f"{resultado.linhas - len(resultado.erros)} de {resultado.linhas} linhas validas.")
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{resultado.criados} alunos importados em {decorrido:.1f}s ({len(resultado.erros)} linhas ignoradas)."
+            )
+        )
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from treinos.models import TreinoDiario
+from treinos.utils import montar_resumos
+
+
+class Command(BaseCommand):
+    help = (
+        "Preenche TreinoDiario.resumo das sessoes finalizadas antes da foto gravada ao finalizar. "
+        "Usa os exercicios atuais do treino e o progresso salvo (em linhas ou compactado), "
+        "com tres consultas por lote."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Sessoes por transacao.")
+        parser.add_argument("--refazer", action="store_true", help="Regrava tambem os resumos ja existentes.")
+        parser.add_argument("--dry-run", action="store_true", help="So conta as sessoes que seriam preenchidas.")
+
+    def handle(self, *args, **options):
+        tamanho = options["chunk_size"]
+        if tamanho < 1:
+            raise CommandError("--chunk-size deve ser positivo.")
+
+        sessoes = TreinoDiario.objects.filter(finalizado=True)
+        if not options["refazer"]:
+            sessoes = sessoes.filter(resumo__isnull=True)
+        total = sessoes.count()
+        if options["dry_run"]:
+            self.stdout.write(f"{total} sessoes seriam preenchidas.")
+            return
+
+        inicio = time.perf_counter()
+        preenchidas = 0
+        ultimo_pk = 0
+        while True:
+            # Paginacao pelo pk: o filtro resumo__isnull deixa de casar com as ja gravadas.
+            lote = list(
+                sessoes.filter(pk__gt=ultimo_pk).select_related("aluno", "treino__ficha__aluno").order_by("pk")[:tamanho]
+            )
+            if not lote:
+                break
+            ultimo_pk = lote[-1].pk
+            self._preencher_lote(lote)
+            preenchidas += len(lote)
+            decorrido = time.perf_counter() - inicio
+            self.stdout.write(f"  {preenchidas}/{total} sessoes ({preenchidas / decorrido:.0f}/s)")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{preenchidas} resumos gravados em {time.perf_counter() - inicio:.1f}s.")
+        )
+
+    def _preencher_lote(self, lote: list[TreinoDiario]) -> None:
+        montar_resumos(lote)
+        with transaction.atomic():
+            TreinoDiario.objects.bulk_update(lote, ["resumo"])
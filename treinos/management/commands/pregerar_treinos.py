@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from treinos.models import Aluno, FichaTreino, Treino, TreinoDiario, TreinoExercicio, TreinoProgresso
+from treinos.utils import atualizar_proximo_treino, em_lotes, invalidar_treino_do_dia
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-gera as sessoes de TreinoDiario (e o progresso) do dia para todos os alunos ativos com ficha ativa. "
+        "Pensado para rodar via cron durante a madrugada, depois da meia-noite e antes dos primeiros treinos: "
+        "as sessoes saem do ponteiro de cada aluno ja avancado pelos treinos da vespera."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--data", help="Data alvo no formato AAAA-MM-DD (padrao: hoje).")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Alunos por transacao.")
+        parser.add_argument(
+            "--progress-every",
+            type=int,
+            default=5000,
+            help="Reporta o andamento a cada N alunos processados (0 desativa).",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Calcula o que seria gerado sem gravar nada.")
+
+    def handle(self, *args, **options):
+        try:
+            alvo = date.fromisoformat(options["data"]) if options["data"] else date.today()
+        except ValueError as exc:
+            raise CommandError(f"Data invalida: {options['data']}") from exc
+        if alvo < date.today():
+            raise CommandError("--data nao pode estar no passado.")
+        tamanho = options["chunk_size"]
+        intervalo = options["progress_every"]
+        dry_run = options["dry_run"]
+        inicio = time.perf_counter()
+
+        antigas = TreinoDiario.objects.filter(pregerado=True, data__lt=date.today())
+        descartadas = antigas.count() if dry_run else antigas.delete()[1].get(TreinoDiario._meta.label, 0)
+
+        alunos = (
+            Aluno.objects.filter(ativo=True)
+            .filter(Exists(FichaTreino.objects.filter(aluno=OuterRef("pk"), ativa=True)))
+            .exclude(Exists(TreinoDiario.objects.filter(aluno=OuterRef("pk"), data=alvo)))
+            .only("pk", "proximo_treino_id")
+            .order_by("pk")
+        )
+        total = alunos.count()
+        self.stdout.write(f"Gerando sessoes de {alvo:%d/%m/%Y} para {total} alunos{' (dry-run)' if dry_run else ''}.")
+
+        processados = sessoes = progressos = reparados = 0
+        proximo_relatorio = intervalo
+        for lote in em_lotes(alunos.iterator(chunk_size=tamanho), tamanho):
+            agendados, reparos = self._resolver_treinos(lote, dry_run)
+            reparados += reparos
+
+            exercicios_por_treino: dict[int, list[int]] = defaultdict(list)
+            for treino_id, exercicio_id in TreinoExercicio.objects.filter(
+                treino_id__in=set(agendados.values())
+            ).values_list("treino_id", "exercicio_id"):
+                exercicios_por_treino[treino_id].append(exercicio_id)
+
+            if dry_run:
+                sessoes += len(agendados)
+                progressos += sum(len(exercicios_por_treino[treino_id]) for treino_id in agendados.values())
+            else:
+                criadas, linhas = self._gravar_lote(alvo, agendados, exercicios_por_treino)
+                sessoes += criadas
+                progressos += linhas
+
+            processados += len(lote)
+            if intervalo and processados >= proximo_relatorio:
+                decorrido = time.perf_counter() - inicio
+                self.stdout.write(
+                    f"  {processados}/{total} alunos, {sessoes} sessoes, {progressos} progressos "
+                    f"({processados / decorrido:.0f} alunos/s)"
+                )
+                proximo_relatorio += intervalo
+
+        decorrido = time.perf_counter() - inicio
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{sessoes} sessoes e {progressos} progressos {'seriam gerados' if dry_run else 'gerados'} "
+                f"em {decorrido:.1f}s ({processados} alunos, {reparados} ponteiros reparados, "
+                f"{descartadas} sessoes antigas nao usadas descartadas)."
+            )
+        )
+
+    def _resolver_treinos(self, lote: list[Aluno], dry_run: bool) -> tuple[dict[int, int], int]:
+        """
+        Devolve {aluno_id: treino_id} usando o ponteiro Aluno.proximo_treino.
+        Ponteiros vazios ou fora da ficha ativa sao reparados um a um (caso raro);
+        no dry-run o reparo roda do mesmo jeito, mas e desfeito, para a previa
+        contar as sessoes desses alunos.
+        """
+        validos = dict(
+            Treino.objects.filter(
+                pk__in=[aluno.proximo_treino_id for aluno in lote if aluno.proximo_treino_id],
+                ficha__ativa=True,
+            ).values_list("pk", "ficha__aluno_id")
+        )
+        agendados: dict[int, int] = {}
+        reparos = 0
+        for aluno in lote:
+            if validos.get(aluno.proximo_treino_id) == aluno.pk:
+                agendados[aluno.pk] = aluno.proximo_treino_id
+                continue
+            reparos += 1
+            with transaction.atomic():
+                treino = atualizar_proximo_treino(aluno)
+                transaction.set_rollback(dry_run)
+            if treino:
+                agendados[aluno.pk] = treino.pk
+        return agendados, reparos
+
+    def _gravar_lote(
+        self,
+        alvo: date,
+        agendados: dict[int, int],
+        exercicios_por_treino: dict[int, list[int]],
+    ) -> tuple[int, int]:
+        with transaction.atomic():
+            TreinoDiario.objects.bulk_create(
+                [
+                    TreinoDiario(aluno_id=aluno_id, treino_id=treino_id, data=alvo, pregerado=True)
+                    for aluno_id, treino_id in agendados.items()
+                ],
+                ignore_conflicts=True,
+            )
+            criadas = TreinoDiario.objects.filter(aluno_id__in=agendados, data=alvo, pregerado=True).values_list(
+                "pk", "treino_id"
+            )
+            progresso = [
+                TreinoProgresso(treino_diario_id=treino_diario_id, exercicio_id=exercicio_id)
+                for treino_diario_id, treino_id in criadas
+                for exercicio_id in exercicios_por_treino[treino_id]
+            ]
+            TreinoProgresso.objects.bulk_create(progresso, ignore_conflicts=True)
+            # bulk_create nao dispara sinais.
+            invalidar_treino_do_dia(*agendados)
+        return len(criadas), len(progresso)
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from treinos.busca import criar_indices
+
+
+class Command(BaseCommand):
+    help = "Recria os indices FTS5 de busca de alunos e fichas (apenas SQLite) a partir das tabelas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "sqlite":
+            self.stdout.write("Banco sem suporte a FTS5; a busca usa LIKE e nao precisa de indice.")
+            return
+        with transaction.atomic(using=connection.alias):
+            criar_indices(connection)
+        self.stdout.write(self.style.SUCCESS("Indices de busca reconstruidos."))
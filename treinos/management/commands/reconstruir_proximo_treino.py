@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from treinos.models import Aluno, FichaTreino, Treino, TreinoDiario
+from treinos.utils import calcular_proximo_treino, em_lotes, proximo_na_rotacao
+
+
+class Command(BaseCommand):
+    help = "Reconstroi o ponteiro Aluno.proximo_treino a partir da ficha ativa e do historico de treinos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Quantidade de alunos processados por lote.")
+
+    def handle(self, *args, **options):
+        tamanho = options["chunk_size"]
+        ultimo_treino = (
+            TreinoDiario.objects.filter(aluno=OuterRef("pk"), pregerado=False).order_by("-data").values("treino_id")[:1]
+        )
+        alunos = (
+            Aluno.objects.annotate(ultimo_treino_id=Subquery(ultimo_treino))
+            .only("pk", "proximo_treino_id")
+            .order_by("pk")
+        )
+
+        total = atualizados = 0
+        for lote in em_lotes(alunos.iterator(chunk_size=tamanho), tamanho):
+            fichas: dict[int, FichaTreino] = {}
+            for ficha in FichaTreino.objects.filter(aluno_id__in=[aluno.pk for aluno in lote], ativa=True).order_by(
+                "-data_criacao"
+            ):
+                fichas.setdefault(ficha.aluno_id, ficha)
+
+            treinos_por_ficha: dict[int, list[Treino]] = defaultdict(list)
+            for treino in Treino.objects.filter(ficha_id__in=[ficha.pk for ficha in fichas.values()]).order_by("ordem"):
+                treinos_por_ficha[treino.ficha_id].append(treino)
+            ultimos = Treino.objects.in_bulk({aluno.ultimo_treino_id for aluno in lote if aluno.ultimo_treino_id})
+
+            alterados = []
+            for aluno in lote:
+                ficha = fichas.get(aluno.pk)
+                if ficha is None:
+                    proximo = None
+                elif not treinos_por_ficha[ficha.pk]:
+                    proximo = calcular_proximo_treino(aluno)
+                else:
+                    proximo = proximo_na_rotacao(treinos_por_ficha[ficha.pk], ultimos.get(aluno.ultimo_treino_id))
+                proximo_id = proximo.pk if proximo else None
+                if aluno.proximo_treino_id != proximo_id:
+                    aluno.proximo_treino_id = proximo_id
+                    alterados.append(aluno)
+
+            with transaction.atomic():
+                Aluno.objects.bulk_update(alterados, ["proximo_treino"])
+            total += len(lote)
+            atualizados += len(alterados)
+
+        self.stdout.write(self.style.SUCCESS(f"{total} alunos verificados, {atualizados} ponteiros atualizados."))
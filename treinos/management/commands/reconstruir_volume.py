@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from treinos.models import TreinoDiario
+from treinos.volume import inicio_da_semana, semana_inicial, reconstruir
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula VolumeSemanal a partir dos resumos das sessoes finalizadas, numa unica consulta agregada. "
+        "Sem --desde, comeca na semana da sessao mais antiga do banco quando ainda nao ha agregados e, depois, "
+        "na primeira semana completa a partir dela; semanas anteriores, como as do historico arquivado, "
+        "sao mantidas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--desde",
+            type=date.fromisoformat,
+            help="Recalcula so a partir da semana desta data (AAAA-MM-DD).",
+        )
+
+    def handle(self, *args, **options):
+        desde = options["desde"]
+        if desde and desde > date.today():
+            raise CommandError("--desde nao pode estar no futuro.")
+
+        semana = inicio_da_semana(desde) if desde else semana_inicial()
+        sem_resumo = TreinoDiario.objects.filter(finalizado=True, resumo__isnull=True)
+        if semana and (faltando := sem_resumo.filter(data__gte=semana).count()):
+            self.stdout.write(
+                self.style.WARNING(f"{faltando} sessoes finalizadas sem resumo ficam de fora; rode preencher_resumos.")
+            )
+
+        inicio = time.perf_counter()
+        linhas = reconstruir(desde)
+        self.stdout.write(self.style.SUCCESS(f"{linhas} linhas de volume semanal em {time.perf_counter() - inicio:.1f}s."))
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import random
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from treinos.models import Aluno, Exercicio, FichaTreino, Treino, TreinoDiario, TreinoExercicio, TreinoProgresso
+from treinos.usuarios import SENHA_PADRAO_ALUNO, id_grupo_aluno
+from treinos.utils import (
+    CHAVE_VERSAO_ALUNOS,
+    CHAVE_VERSAO_CATALOGO,
+    CHAVE_VERSAO_PAPEIS,
+    em_lotes,
+    invalidar_versao,
+    montar_resumo,
+)
+from treinos.volume import reconstruir as reconstruir_volume
+
+User = get_user_model()
+
+NOMES = (
+    "Ana", "Bruno", "Carla", "Diego", "Eduarda", "Felipe", "Gabriela", "Henrique", "Isabela", "Joao",
+    "Larissa", "Marcos", "Natalia", "Otavio", "Paula", "Rafael", "Sofia", "Thiago", "Vitoria", "Wesley",
+)
+SOBRENOMES = (
+    "Almeida", "Barbosa", "Cardoso", "Costa", "Ferreira", "Gomes", "Lima", "Martins", "Oliveira", "Pereira",
+    "Ribeiro", "Rodrigues", "Santos", "Silva", "Souza",
+)
+CATALOGO = {
+    "Peito": ("Supino reto", "Supino inclinado", "Crucifixo", "Crossover", "Flexao de bracos"),
+    "Costas": ("Puxada frontal", "Remada curvada", "Remada baixa", "Barra fixa", "Pulldown"),
+    "Pernas": ("Agachamento livre", "Leg press", "Cadeira extensora", "Mesa flexora", "Panturrilha em pe"),
+    "Ombros": ("Desenvolvimento", "Elevacao lateral", "Elevacao frontal", "Crucifixo invertido"),
+    "Biceps": ("Rosca direta", "Rosca alternada", "Rosca martelo", "Rosca scott"),
+    "Triceps": ("Triceps pulley", "Triceps testa", "Triceps frances", "Mergulho"),
+    "Abdomen": ("Abdominal supra", "Prancha", "Elevacao de pernas"),
+    "Gluteos": ("Elevacao pelvica", "Abducao", "Gluteo no cabo"),
+}
+ROTACOES = ("AB", "ABC", "ABC", "ABCD")
+MINUTOS_POR_EXERCICIO = 5
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera uma massa de dados sintetica (alunos com usuario, catalogo de exercicios, fichas com rotacao "
+        "A/B/C e meses de historico de TreinoDiario, com resumo, e TreinoProgresso) via bulk_create em lotes, "
+        "para reproduzir localmente volumes de producao."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--alunos", type=int, default=1000, help="Quantidade de alunos gerados.")
+        parser.add_argument("--meses", type=int, default=6, help="Meses de historico por aluno.")
+        parser.add_argument("--seed", type=int, default=42, help="Semente do gerador (mesma semente, mesmos dados).")
+        parser.add_argument("--chunk-size", type=int, default=250, help="Alunos por transacao.")
+        parser.add_argument(
+            "--prefixo",
+            default="seed",
+            help="Prefixo de usernames e emails gerados; precisa ser unico entre execucoes.",
+        )
+        parser.add_argument("--ate", help="Ultimo dia do historico, AAAA-MM-DD (padrao: ontem).")
+
+    def handle(self, *args, **options):
+        quantidade = options["alunos"]
+        meses = options["meses"]
+        tamanho = options["chunk_size"]
+        prefixo = options["prefixo"]
+        if quantidade < 1 or meses < 0 or tamanho < 1:
+            raise CommandError("--alunos e --chunk-size devem ser positivos e --meses nao pode ser negativo.")
+        try:
+            ate = date.fromisoformat(options["ate"]) if options["ate"] else date.today() - timedelta(days=1)
+        except ValueError as exc:
+            raise CommandError(f"Data invalida: {options['ate']}") from exc
+        if User.objects.filter(username__startswith=f"{prefixo}.").exists():
+            raise CommandError(f"Ja existem usuarios com o prefixo '{prefixo}'. Use outro --prefixo.")
+
+        self.rng = random.Random(options["seed"])
+        self.ate = ate
+        self.inicio_historico = ate - timedelta(days=30 * meses)
+        self.contagem: Counter[str] = Counter()
+        inicio = time.perf_counter()
+
+        # Um unico hash para todos: make_password custa dezenas de milissegundos por chamada.
+        self.senha = make_password(SENHA_PADRAO_ALUNO)
+        self.grupo_aluno_id = id_grupo_aluno()
+        self.exercicios = self._garantir_catalogo()
+
+        geradas = 0
+        for lote in em_lotes(range(quantidade), tamanho):
+            with transaction.atomic():
+                self._gerar_lote(prefixo, lote)
+            geradas += len(lote)
+            decorrido = time.perf_counter() - inicio
+            self.stdout.write(
+                f"  {geradas}/{quantidade} alunos, {sum(self.contagem.values())} linhas "
+                f"({sum(self.contagem.values()) / decorrido:.0f} linhas/s)"
+            )
+
+        # bulk_create nao dispara sinais: invalida os caches de sessao e o catalogo uma vez no fim.
+        invalidar_versao(CHAVE_VERSAO_ALUNOS, CHAVE_VERSAO_PAPEIS, CHAVE_VERSAO_CATALOGO)
+        # Nem o volume semanal: recalcula os agregados desde a semana em que o historico gerado comeca.
+        reconstruir_volume(self.inicio_historico)
+
+        decorrido = time.perf_counter() - inicio
+        total = sum(self.contagem.values())
+        detalhes = ", ".join(f"{modelo}: {linhas}" for modelo, linhas in self.contagem.items())
+        self.stdout.write(
+            self.style.SUCCESS(f"{total} linhas geradas em {decorrido:.1f}s ({total / decorrido:.0f} linhas/s). {detalhes}.")
+        )
+
+    def _garantir_catalogo(self) -> list[Exercicio]:
+        existentes = set(Exercicio.objects.values_list("nome", flat=True))
+        novos = [
+            Exercicio(nome=nome, grupo_muscular=grupo, descricao=f"{nome} ({grupo.lower()}).")
+            for grupo, nomes in CATALOGO.items()
+            for nome in nomes
+            if nome not in existentes
+        ]
+        Exercicio.objects.bulk_create(novos)
+        self.contagem["Exercicio"] += len(novos)
+        nomes = {nome for nomes in CATALOGO.values() for nome in nomes}
+        return list(Exercicio.objects.filter(nome__in=nomes).order_by("pk"))
+
+    def _gerar_lote(self, prefixo: str, indices: list[int]) -> None:
+        rng = self.rng
+        pessoas = []
+        for indice in indices:
+            nome, sobrenome = rng.choice(NOMES), rng.choice(SOBRENOMES)
+            pessoas.append((f"{prefixo}.{indice:07d}", f"{nome} {sobrenome}", nome, sobrenome))
+
+        usuarios = User.objects.bulk_create(
+            [
+                User(
+                    username=username,
+                    email=f"{username}@gymtrack.invalid",
+                    password=self.senha,
+                    first_name=nome,
+                    last_name=sobrenome,
+                )
+                for username, _, nome, sobrenome in pessoas
+            ]
+        )
+        User.groups.through.objects.bulk_create(
+            [User.groups.through(user_id=usuario.pk, group_id=self.grupo_aluno_id) for usuario in usuarios]
+        )
+        # Com o usuario ja vinculado o sinal de sincronizacao seria no-op; bulk_create nem o dispara.
+        alunos = Aluno.objects.bulk_create(
+            [
+                Aluno(
+                    nome=nome_completo,
+                    email=usuario.email,
+                    data_nascimento=date(rng.randint(1960, 2008), rng.randint(1, 12), rng.randint(1, 28)),
+                    usuario=usuario,
+                )
+                for usuario, (_, nome_completo, _, _) in zip(usuarios, pessoas)
+            ]
+        )
+        fichas = FichaTreino.objects.bulk_create(
+            [FichaTreino(aluno=aluno, nome="Ficha principal", motivo="Hipertrofia", ativa=True) for aluno in alunos]
+        )
+
+        rotacoes = [rng.choice(ROTACOES) for _ in fichas]
+        treinos = Treino.objects.bulk_create(
+            [
+                Treino(ficha=ficha, nome=letra, ordem=ordem, total_exercicios=rng.randint(4, 8))
+                for ficha, rotacao in zip(fichas, rotacoes)
+                for ordem, letra in enumerate(rotacao, start=1)
+            ]
+        )
+        itens_por_treino: dict[int, list[TreinoExercicio]] = {}
+        for treino in treinos:
+            escolhidos = rng.sample(self.exercicios, treino.total_exercicios)
+            itens_por_treino[treino.pk] = [
+                TreinoExercicio(
+                    treino=treino,
+                    exercicio=exercicio,
+                    series=rng.choice((3, 4)),
+                    repeticoes=rng.choice((8, 10, 12, 15)),
+                    ordem=ordem,
+                )
+                for ordem, exercicio in enumerate(escolhidos, start=1)
+            ]
+        itens = [item for itens_treino in itens_por_treino.values() for item in itens_treino]
+        TreinoExercicio.objects.bulk_create(itens)
+
+        treinos_por_ficha: dict[int, list[Treino]] = {}
+        for treino in treinos:
+            treinos_por_ficha.setdefault(treino.ficha_id, []).append(treino)
+
+        sessoes = []
+        concluidos = []
+        for aluno, ficha in zip(alunos, fichas):
+            rotacao = treinos_por_ficha[ficha.pk]
+            posicao = 0
+            for dia in self._dias_de_treino():
+                treino = rotacao[posicao % len(rotacao)]
+                sessao = self._sessao(aluno, treino, dia)
+                feitos = {item.exercicio_id for item in itens_por_treino[treino.pk] if rng.random() < 0.9}
+                sessao.resumo = montar_resumo(sessao, itens_por_treino[treino.pk], feitos)
+                sessoes.append(sessao)
+                concluidos.append(feitos)
+                posicao += 1
+            aluno.proximo_treino = rotacao[posicao % len(rotacao)]
+        sessoes = TreinoDiario.objects.bulk_create(sessoes)
+        Aluno.objects.bulk_update(alunos, ["proximo_treino"])
+
+        progresso = [
+            TreinoProgresso(treino_diario=sessao, exercicio_id=item.exercicio_id, concluido=item.exercicio_id in feitos)
+            for sessao, feitos in zip(sessoes, concluidos)
+            for item in itens_por_treino[sessao.treino_id]
+        ]
+        TreinoProgresso.objects.bulk_create(progresso)
+
+        self.contagem["User"] += len(usuarios)
+        self.contagem["Aluno"] += len(alunos)
+        self.contagem["FichaTreino"] += len(fichas)
+        self.contagem["Treino"] += len(treinos)
+        self.contagem["TreinoExercicio"] += len(itens)
+        self.contagem["TreinoDiario"] += len(sessoes)
+        self.contagem["TreinoProgresso"] += len(progresso)
+
+    def _dias_de_treino(self) -> list[date]:
+        """
+        Dias treinados pelo aluno: de 2 a 5 vezes por semana, em dias da semana fixos.
+        """
+        if self.inicio_historico >= self.ate:
+            return []
+        dias_semana = set(self.rng.sample(range(7), self.rng.randint(2, 5)))
+        dias = []
+        dia = self.inicio_historico
+        while dia <= self.ate:
+            # Faltas ocasionais deixam o historico menos regular.
+            if dia.weekday() in dias_semana and self.rng.random() < 0.85:
+                dias.append(dia)
+            dia += timedelta(days=1)
+        return dias
+
+    def _sessao(self, aluno: Aluno, treino: Treino, dia: date) -> TreinoDiario:
+        started_at = timezone.make_aware(datetime.combine(dia, datetime.min.time())) + timedelta(
+            hours=self.rng.randint(6, 21), minutes=self.rng.randint(0, 59)
+        )
+        tempo_total = timedelta(minutes=treino.total_exercicios * MINUTOS_POR_EXERCICIO + self.rng.randint(-10, 20))
+        return TreinoDiario(
+            aluno=aluno,
+            treino=treino,
+            data=dia,
+            finalizado=True,
+            started_at=started_at,
+            finished_at=started_at + tempo_total,
+            tempo_total=tempo_total,
+            tempo_medio_exercicio=tempo_total / treino.total_exercicios,
+        )
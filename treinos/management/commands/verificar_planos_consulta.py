@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from treinos import planos
+
+
+class Command(BaseCommand):
+    help = (
+        "Executa EXPLAIN QUERY PLAN nas consultas de selecionar_treino_do_dia, historico_treinos, progresso, "
+        "lista_fichas, lista_treinos e volume_semanal e falha se alguma tabela do app for lida por varredura "
+        "completa. Os dados de apoio sao criados numa transacao desfeita ao final (apenas SQLite). "
+        "Os mesmos planos sao conferidos por treinos.tests.test_planos_consulta."
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("A verificacao de planos usa EXPLAIN QUERY PLAN e so roda no SQLite.")
+
+        with transaction.atomic():
+            try:
+                consultas = planos.capturar_consultas(*planos.criar_dados_de_apoio())
+            except RuntimeError as exc:
+                raise CommandError(str(exc)) from exc
+            falhas = []
+            for origem, sql in consultas:
+                passos = planos.plano(sql)
+                varreduras = planos.varreduras_completas(sql, passos)
+                if options["verbosity"] > 1 or varreduras:
+                    self.stdout.write(f"[{origem}] {sql}")
+                    for passo in passos:
+                        self.stdout.write(f"    {passo}")
+                if varreduras:
+                    falhas.append((origem, varreduras))
+            transaction.set_rollback(True)
+
+        if falhas:
+            resumo = "; ".join(f"{origem}: {', '.join(passos)}" for origem, passos in falhas)
+            raise CommandError(f"{len(falhas)} consulta(s) com varredura completa: {resumo}")
+        self.stdout.write(self.style.SUCCESS(f"{len(consultas)} consultas verificadas, nenhuma varredura completa."))
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+from treinos import consultas_lentas
+from treinos.desempenho import Medicao, Perfilador, agregador, cronometrar_sql, medicao_atual
+from treinos.utils import obter_papeis, resolver_aluno
+
+
+class AlunoMiddleware:
+    """
+    Anexa `request.aluno`, resolvido sob demanda e no maximo uma vez por requisicao.
+    Deve vir depois do AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.aluno = SimpleLazyObject(lambda: resolver_aluno(request))
+        return self.get_response(request)
+
+
+class PapeisMiddleware:
+    """
+    Resolve os grupos do usuario logado no inicio da requisicao, usando o cache
+    em sessao, para que o filtro `has_group` e o `bloquear_para_aluno` nao
+    consultem o banco. Deve vir depois do AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.user.is_authenticated:
+            obter_papeis(request.user, request.session)
+        return self.get_response(request)
+
+
+class DesempenhoMiddleware:
+    """
+    Mede tempo total, consultas SQL (quantidade e tempo) e renderizacao de
+    templates de cada requisicao, devolve os valores no header `Server-Timing`
+    e agrega por nome de rota (ver `treinos:desempenho`).
+    Ligado por `GYMTRACK_DESEMPENHO`; deve ser o primeiro da lista.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "GYMTRACK_DESEMPENHO", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicao = Medicao()
+        token = medicao_atual.set(medicao)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pilha:
+                for conexao in connections.all():
+                    pilha.enter_context(conexao.execute_wrapper(cronometrar_sql))
+                response = self.get_response(request)
+        finally:
+            medicao_atual.reset(token)
+        total = time.perf_counter() - inicio
+
+        match = request.resolver_match
+        agregador.registrar(match.view_name if match else "<nao resolvida>", total, medicao)
+        response.headers["Server-Timing"] = (
+            f"total;dur={total * 1000:.1f}, "
+            f'sql;dur={medicao.tempo_sql * 1000:.1f};desc="{medicao.consultas} consultas", '
+            f"tpl;dur={medicao.tempo_template * 1000:.1f}"
+        )
+        return response
+
+
+class PerfilamentoMiddleware:
+    """
+    Perfilamento sob demanda: requisicoes de staff com `?_perfil=1` ou o header
+    `X-Gymtrack-Perfil: 1` rodam sob cProfile e geram arquivos em
+    `GYMTRACK_PERFIL_DIR` (o nome volta no header `X-Gymtrack-Perfil`).
+    `GYMTRACK_PERFIL_USUARIOS` restringe a usernames especificos. Sem diretorio
+    configurado o middleware nem entra na cadeia. Deve vir depois do
+    AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        diretorio = getattr(settings, "GYMTRACK_PERFIL_DIR", None)
+        if not diretorio:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.perfilador = Perfilador(diretorio, getattr(settings, "GYMTRACK_PERFIL_MANTER", 20))
+        self.usuarios = set(getattr(settings, "GYMTRACK_PERFIL_USUARIOS", ()))
+
+    def __call__(self, request):
+        if not self._solicitado(request):
+            return self.get_response(request)
+        response, nome = self.perfilador.executar(self.get_response, request)
+        if nome:
+            response.headers["X-Gymtrack-Perfil"] = nome
+        return response
+
+    def _solicitado(self, request) -> bool:
+        if request.GET.get("_perfil") != "1" and request.headers.get("X-Gymtrack-Perfil") != "1":
+            return False
+        user = request.user
+        if not (user.is_authenticated and user.is_staff):
+            return False
+        return not self.usuarios or user.get_username() in self.usuarios
+
+
+class ConsultasLentasMiddleware:
+    """
+    Instala o log de consultas lentas na conexao `default` durante a
+    requisicao, associa as consultas a rota/view e relata formas repetidas
+    (provaveis N+1) ao final. So entra na cadeia com
+    `GYMTRACK_CONSULTAS_LENTAS_LOG` configurado.
+    """
+
+    def __init__(self, get_response):
+        if not consultas_lentas.configurado():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        estado = consultas_lentas.EstadoRequisicao(request)
+        token = consultas_lentas.requisicao_atual.set(estado)
+        try:
+            # Como contexto (e nao um append permanente), os wrappers da conexao
+            # continuam sendo desempilhados na ordem certa junto com os do
+            # DesempenhoMiddleware.
+            with connections["default"].execute_wrapper(consultas_lentas.registrar_consulta):
+                return self.get_response(request)
+        finally:
+            consultas_lentas.requisicao_atual.reset(token)
+            consultas_lentas.finalizar_requisicao(estado)
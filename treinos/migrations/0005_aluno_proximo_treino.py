@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('treinos', '0004_aluno_usuario_treinodiario_finished_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aluno',
+            name='proximo_treino',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='treinos.treino'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('treinos', '0005_aluno_proximo_treino'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='treinodiario',
+            name='pregerado',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def preencher_total_exercicios(apps, schema_editor):
+    Treino = apps.get_model('treinos', 'Treino')
+    TreinoExercicio = apps.get_model('treinos', 'TreinoExercicio')
+    total = (
+        TreinoExercicio.objects.filter(treino=OuterRef('pk'))
+        .order_by()
+        .values('treino')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Treino.objects.update(total_exercicios=Coalesce(Subquery(total), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('treinos', '0006_treinodiario_pregerado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='treino',
+            name='total_exercicios',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(preencher_total_exercicios, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from treinos.busca import criar_indices, remover_indices
+
+
+def criar(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        criar_indices(schema_editor.connection)
+
+
+def remover(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        remover_indices(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('treinos', '0007_treino_total_exercicios'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar, remover),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:46
+
+from django.db import migrations, models
+
+
+def desativar_fichas_duplicadas(apps, schema_editor):
+    """
+    Mantem apenas a ficha ativa mais recente de cada aluno antes de criar o indice unico parcial.
+    """
+    FichaTreino = apps.get_model('treinos', 'FichaTreino')
+    vistos = set()
+    duplicadas = []
+    for ficha_id, aluno_id in (
+        FichaTreino.objects.filter(ativa=True).order_by('aluno_id', '-data_criacao', '-id').values_list('id', 'aluno_id')
+    ):
+        if aluno_id in vistos:
+            duplicadas.append(ficha_id)
+        vistos.add(aluno_id)
+    FichaTreino.objects.filter(pk__in=duplicadas).update(ativa=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('treinos', '0008_busca_textual'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fichatreino',
+            index=models.Index(fields=['aluno', 'ativa', 'data_criacao'], name='ficha_aluno_ativa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fichatreino',
+            index=models.Index(fields=['data_criacao'], name='ficha_data_criacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fichatreino',
+            index=models.Index(fields=['nome'], name='ficha_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treinodiario',
+            index=models.Index(fields=['aluno', 'finalizado', 'data'], name='treinodiario_aluno_final_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treinodiario',
+            index=models.Index(condition=models.Q(('pregerado', False), ('treino__isnull', False)), fields=['data'], name='treinodiario_listagem_idx'),
+        ),
+        migrations.RunPython(desativar_fichas_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='fichatreino',
+            constraint=models.UniqueConstraint(condition=models.Q(('ativa', True)), fields=('aluno',), name='ficha_ativa_unica_por_aluno', violation_error_message='Este aluno ja possui uma ficha ativa.'),
+        ),
+    ]
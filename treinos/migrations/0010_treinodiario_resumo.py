@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('treinos', '0009_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='treinodiario',
+            name='resumo',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
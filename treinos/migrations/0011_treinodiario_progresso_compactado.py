@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('treinos', '0010_treinodiario_resumo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='treinodiario',
+            name='progresso_compactado',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:15
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('treinos', '0011_treinodiario_progresso_compactado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VolumeSemanal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semana', models.DateField(help_text='Segunda-feira da semana ISO.')),
+                ('grupo_muscular', models.CharField(max_length=100)),
+                ('sessoes', models.PositiveIntegerField(default=0)),
+                ('exercicios_concluidos', models.PositiveIntegerField(default=0)),
+                ('volume', models.PositiveIntegerField(default=0)),
+                ('tempo_total', models.DurationField(default=datetime.timedelta)),
+                ('aluno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='volumes_semanais', to='treinos.aluno')),
+            ],
+            options={
+                'ordering': ['-semana', 'grupo_muscular'],
+                'indexes': [models.Index(fields=['semana', 'grupo_muscular', 'aluno'], name='volumesemanal_semana_grupo_idx')],
+                'unique_together': {('aluno', 'semana', 'grupo_muscular')},
+            },
+        ),
+    ]
@@ -1,5 +1,8 @@
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 User = get_user_model()
@@ -11,6 +14,17 @@ class Aluno(models.Model):
     data_nascimento = models.DateField()
     ativo = models.BooleanField(default=True)
     usuario = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True, related_name="perfil_aluno")
+    proximo_treino = models.ForeignKey(
+        "Treino",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        editable=False,
+    )
+
+    # Campos que, quando mudam, exigem sincronizar o usuario vinculado.
+    CAMPOS_SINCRONIZADOS = ("nome", "email", "usuario_id")
 
     class Meta:
         ordering = ["nome"]
@@ -18,6 +32,49 @@ class Aluno(models.Model):
     def __str__(self) -> str:
         return self.nome
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._guardar_estado()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._guardar_estado(kwargs.get("update_fields"))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._guardar_estado(fields)
+
+    def _guardar_estado(self, campos=None) -> None:
+        """
+        Guarda os valores dos campos sincronizados como estao no banco. Com
+        `campos` (update_fields/refresh parcial) so esses sao atualizados.
+        """
+        estado = getattr(self, "_estado_salvo", None)
+        if estado is None or campos is None:
+            estado = self._estado_salvo = {}
+            campos = self.CAMPOS_SINCRONIZADOS
+        else:
+            campos = {self._meta.get_field(campo).attname for campo in campos}
+        for campo in self.CAMPOS_SINCRONIZADOS:
+            if campo in campos and campo in self.__dict__:
+                estado[campo] = self.__dict__[campo]
+
+    def campos_alterados(self) -> set[str]:
+        """
+        Campos de CAMPOS_SINCRONIZADOS que mudaram desde a leitura ou o ultimo
+        save. Instancias ainda nao salvas tem todos como alterados.
+        """
+        estado = getattr(self, "_estado_salvo", None)
+        if estado is None:
+            return set(self.CAMPOS_SINCRONIZADOS)
+        return {
+            campo
+            for campo in self.CAMPOS_SINCRONIZADOS
+            if campo in self.__dict__ and (campo not in estado or estado[campo] != self.__dict__[campo])
+        }
+
 
 class Exercicio(models.Model):
     nome = models.CharField(max_length=150)
@@ -41,6 +98,19 @@ class FichaTreino(models.Model):
 
     class Meta:
         ordering = ["-data_criacao"]
+        indexes = [
+            models.Index(fields=["aluno", "ativa", "data_criacao"], name="ficha_aluno_ativa_idx"),
+            models.Index(fields=["data_criacao"], name="ficha_data_criacao_idx"),
+            models.Index(fields=["nome"], name="ficha_nome_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["aluno"],
+                condition=models.Q(ativa=True),
+                name="ficha_ativa_unica_por_aluno",
+                violation_error_message="Este aluno ja possui uma ficha ativa.",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"Ficha {self.aluno.nome} - {self.data_criacao:%d/%m/%Y}"
@@ -50,6 +120,7 @@ class Treino(models.Model):
     ficha = models.ForeignKey(FichaTreino, on_delete=models.CASCADE, related_name="treinos")
     nome = models.CharField(max_length=50)
     ordem = models.PositiveIntegerField(default=1)
+    total_exercicios = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ["ordem"]
@@ -57,6 +128,22 @@ class Treino(models.Model):
     def __str__(self) -> str:
         return f"{self.ficha} - Treino {self.nome}"
 
+    @classmethod
+    def recontar_exercicios(cls, *treino_ids: int) -> None:
+        """
+        Recalcula `total_exercicios` num unico UPDATE. Chamada ao criar, mover
+        ou excluir um TreinoExercicio (formset, admin) e, uma vez por
+        Exercicio, na exclusao em cascata dele.
+        """
+        contagem = (
+            TreinoExercicio.objects.filter(treino=models.OuterRef("pk"))
+            .order_by()
+            .values("treino")
+            .annotate(total=models.Count("pk"))
+            .values("total")
+        )
+        cls.objects.filter(pk__in=treino_ids).update(total_exercicios=Coalesce(models.Subquery(contagem), 0))
+
 
 class TreinoExercicio(models.Model):
     treino = models.ForeignKey(Treino, on_delete=models.CASCADE, related_name="exercicios")
@@ -72,6 +159,25 @@ class TreinoExercicio(models.Model):
     def __str__(self) -> str:
         return f"{self.treino} - {self.exercicio.nome}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Treino como esta no banco: o post_save reconta o antigo e o novo quando a linha muda de treino.
+        instance._treino_salvo = instance.__dict__.get("treino_id")
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._treino_salvo = self.treino_id
+
+    def delete(self, *args, **kwargs):
+        # Sem receptores de delete no modelo: as exclusoes em cascata (Exercicio,
+        # Treino, Ficha) continuam rapidas, e a de um Exercicio reconta os treinos
+        # afetados de uma vez (ver treinos.signals). Aqui so a exclusao direta.
+        resultado = super().delete(*args, **kwargs)
+        Treino.recontar_exercicios(self.treino_id)
+        return resultado
+
 
 class TreinoDiario(models.Model):
     aluno = models.ForeignKey(Aluno, on_delete=models.CASCADE, related_name="treinos_diarios")
@@ -82,17 +188,33 @@ class TreinoDiario(models.Model):
     finished_at = models.DateTimeField(null=True, blank=True)
     tempo_total = models.DurationField(null=True, blank=True)
     tempo_medio_exercicio = models.DurationField(null=True, blank=True)
+    pregerado = models.BooleanField(default=False, editable=False)
+    # Foto imutavel gravada ao finalizar (ver treinos.utils.montar_resumo):
+    # historico e detalhes nao dependem mais da ficha atual.
+    resumo = models.JSONField(null=True, blank=True, editable=False)
+    # Progresso das sessoes antigas depois de `compactar_progresso` (ver treinos.compactacao).
+    progresso_compactado = models.BinaryField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ["-data"]
         unique_together = ("aluno", "data")
+        indexes = [
+            models.Index(fields=["aluno", "finalizado", "data"], name="treinodiario_aluno_final_idx"),
+            models.Index(
+                fields=["data"],
+                name="treinodiario_listagem_idx",
+                condition=models.Q(pregerado=False, treino__isnull=False),
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"Treino {self.aluno.nome} - {self.data:%d/%m/%Y}"
 
     @property
     def estimativa_duracao(self) -> int:
-        return self.treino.exercicios.count() * 5
+        if self.resumo:
+            return len(self.resumo["exercicios"]) * 5
+        return self.treino.total_exercicios * 5
 
 
 class TreinoProgresso(models.Model):
@@ -113,3 +235,28 @@ class TreinoProgresso(models.Model):
     def __str__(self) -> str:
         return f"{self.treino_diario} - {self.exercicio.nome}"
 
+
+class VolumeSemanal(models.Model):
+    """
+    Volume de treino por aluno, semana ISO e grupo muscular, somado ao
+    finalizar cada sessao (ver treinos.volume). As telas de progresso leem
+    so daqui, nunca do historico inteiro.
+    """
+
+    aluno = models.ForeignKey(Aluno, on_delete=models.CASCADE, related_name="volumes_semanais")
+    semana = models.DateField(help_text="Segunda-feira da semana ISO.")
+    grupo_muscular = models.CharField(max_length=100)
+    sessoes = models.PositiveIntegerField(default=0)
+    exercicios_concluidos = models.PositiveIntegerField(default=0)
+    # Soma de series x repeticoes dos exercicios concluidos.
+    volume = models.PositiveIntegerField(default=0)
+    tempo_total = models.DurationField(default=timedelta)
+
+    class Meta:
+        ordering = ["-semana", "grupo_muscular"]
+        unique_together = ("aluno", "semana", "grupo_muscular")
+        # Cobre o agrupamento da visao do instrutor (semana, grupo e alunos distintos).
+        indexes = [models.Index(fields=["semana", "grupo_muscular", "aluno"], name="volumesemanal_semana_grupo_idx")]
+
+    def __str__(self) -> str:
+        return f"{self.aluno.nome} - {self.semana:%d/%m/%Y} - {self.grupo_muscular}"
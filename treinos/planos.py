@@ -0,0 +1,120 @@
+"""
+Planos de consulta (EXPLAIN QUERY PLAN, so SQLite) das funcoes e telas mais
+usadas: as consultas sao capturadas executando cada uma e cada plano e
+conferido contra varreduras completas das tabelas do app. Usado pelos testes
+de treinos.tests e pelo comando verificar_planos_consulta.
+"""
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from treinos.models import Aluno, Exercicio, FichaTreino, Treino, TreinoDiario, TreinoExercicio, VolumeSemanal
+from treinos.utils import calcular_proximo_treino, selecionar_treino_do_dia
+from treinos.volume import inicio_da_semana
+
+User = get_user_model()
+
+# Trechos do EXPLAIN QUERY PLAN que indicam leitura guiada por indice (ou sem tabela).
+ACESSOS_INDEXADOS = ("USING INDEX", "USING COVERING INDEX", "USING INTEGER PRIMARY KEY", "VIRTUAL TABLE", "CONSTANT ROW")
+
+
+def clausula_where(sql: str) -> str:
+    """
+    Trecho entre o WHERE e o ORDER BY/LIMIT da consulta principal (vazio sem WHERE).
+    """
+    _, separador, resto = sql.partition(" WHERE ")
+    if not separador:
+        return ""
+    for fim in (" ORDER BY ", " LIMIT "):
+        resto = resto.split(fim)[0]
+    return resto
+
+
+def plano(sql: str) -> list[str]:
+    """
+    Passos do EXPLAIN QUERY PLAN da consulta.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return [linha[-1] for linha in cursor.fetchall()]
+
+
+def varreduras_completas(sql: str, passos: list[str]) -> list[str]:
+    """
+    Passos "SCAN <tabela>" sem indice. Uma varredura na ordem da chave primaria
+    com LIMIT e sem ordenacao temporaria para cedo e nao e considerada completa,
+    desde que o WHERE nao filtre essa tabela: tabela filtrada exige busca por indice.
+    """
+    limitada = " LIMIT " in sql and not any(passo.startswith("USE TEMP B-TREE FOR ORDER BY") for passo in passos)
+    filtro = clausula_where(sql)
+    falhas = []
+    for passo in passos:
+        if not passo.startswith("SCAN ") or "treinos_" not in passo:
+            continue
+        if any(acesso in passo for acesso in ACESSOS_INDEXADOS):
+            continue
+        tabela = passo.split()[1]
+        if limitada and f'"{tabela}".' not in filtro:
+            continue
+        falhas.append(passo)
+    return falhas
+
+
+def criar_dados_de_apoio() -> tuple[User, Aluno]:
+    """
+    Instrutor e aluno com ficha, treino, sessao finalizada e volume: o minimo
+    para cada consulta do roteiro rodar. Chame dentro de uma transacao desfeita.
+    """
+    instrutor = User.objects.create_user(username="_planos_instrutor", password=None, is_staff=True)
+    aluno = Aluno.objects.create(nome="Planos Consulta", email="_planos@gymtrack.invalid", data_nascimento=date(2000, 1, 1))
+    exercicio = Exercicio.objects.create(nome="Planos", grupo_muscular="Planos", descricao="")
+    ficha = FichaTreino.objects.create(aluno=aluno, nome="Planos", ativa=True)
+    treino = Treino.objects.create(ficha=ficha, nome="A", ordem=1)
+    TreinoExercicio.objects.create(treino=treino, exercicio=exercicio, series=3, repeticoes=10, ordem=1)
+    ontem = date.today() - timedelta(days=1)
+    TreinoDiario.objects.create(aluno=aluno, treino=treino, data=ontem, finalizado=True)
+    VolumeSemanal.objects.create(aluno=aluno, semana=inicio_da_semana(ontem), grupo_muscular="Planos", sessoes=1)
+    aluno.refresh_from_db()
+    return instrutor, aluno
+
+
+def capturar_consultas(instrutor: User, aluno: Aluno, host: str = "localhost") -> list[tuple[str, str]]:
+    """
+    Executa o roteiro e devolve (origem, sql) de cada SELECT nas tabelas do app.
+    """
+    cliente_instrutor = Client(HTTP_HOST=host)
+    cliente_instrutor.force_login(instrutor)
+    cliente_aluno = Client(HTTP_HOST=host)
+    cliente_aluno.force_login(aluno.usuario)
+
+    roteiro = [
+        ("calcular_proximo_treino", lambda: calcular_proximo_treino(aluno)),
+        ("selecionar_treino_do_dia", lambda: selecionar_treino_do_dia(aluno)),
+        ("historico_treinos", lambda: cliente_aluno.get("/historico/")),
+        ("progresso", lambda: cliente_aluno.get("/progresso/")),
+        ("lista_treinos", lambda: cliente_instrutor.get("/lista-treinos/")),
+        ("lista_treinos (busca)", lambda: cliente_instrutor.get("/lista-treinos/?aluno=planos")),
+        ("volume_semanal", lambda: cliente_instrutor.get("/volume/")),
+    ]
+    for campo in ("data_criacao", "aluno", "nome", "id"):
+        for direcao in ("asc", "desc"):
+            url = f"/lista-fichas/?ordenar={campo}&direcao={direcao}"
+            roteiro.append((f"lista_fichas ({campo} {direcao})", lambda url=url: cliente_instrutor.get(url)))
+    roteiro.append(("lista_fichas (busca)", lambda: cliente_instrutor.get("/lista-fichas/?q=planos")))
+
+    consultas = []
+    for origem, executar in roteiro:
+        with CaptureQueriesContext(connection) as capturadas:
+            resultado = executar()
+        if getattr(resultado, "status_code", 200) != 200:
+            raise RuntimeError(f"{origem} respondeu {resultado.status_code}; o plano nao seria representativo.")
+        for consulta in capturadas.captured_queries:
+            sql = consulta["sql"]
+            if sql.startswith("SELECT") and "treinos_" in sql:
+                consultas.append((origem, sql))
+    return consultas
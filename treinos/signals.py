@@ -1,24 +1,30 @@
 from __future__ import annotations
 
+from datetime import date
+
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from .models import Aluno
+from .models import Aluno, Exercicio, FichaTreino, Treino, TreinoDiario, TreinoExercicio
+from .usuarios import SENHA_PADRAO_ALUNO, id_grupo_aluno, nome_para_usuario, slugify_username
+from .utils import (
+    CHAVE_VERSAO_ALUNOS,
+    CHAVE_VERSAO_CATALOGO,
+    CHAVE_VERSAO_PAPEIS,
+    atualizar_proximo_treino,
+    avancar_proximo_treino,
+    chave_versao_aluno_usuario,
+    chave_versao_papeis_usuario,
+    invalidar_treino_do_dia,
+    invalidar_versao,
+)
 
 User = get_user_model()
 
 
-def _slugify_username(nome: str) -> str:
-    partes = (nome or "").strip().lower().split()
-    if not partes:
-        return ""
-    if len(partes) == 1:
-        return partes[0]
-    return f"{partes[0]}.{partes[-1]}"
-
-
 def _unique_username(base: str) -> str:
     """
     Garante um username único; se já existir, acrescenta sufixo numérico.
@@ -31,52 +37,172 @@ def _unique_username(base: str) -> str:
     return candidate
 
 
-def _obter_grupo_aluno() -> Group:
-    grupo, _ = Group.objects.get_or_create(name="aluno")
-    return grupo
-
-
 @receiver(post_save, sender=Aluno)
-def criar_ou_atualizar_usuario_aluno(sender, instance: Aluno, created: bool, **kwargs) -> None:
+def criar_ou_atualizar_usuario_aluno(sender, instance: Aluno, created: bool, update_fields=None, **kwargs) -> None:
     """
     Garante que cada Aluno possua um usuário Django vinculado.
     - Cria com username baseado no nome, email do aluno e senha padrão.
     - Vincula ao grupo 'aluno'.
     - Mantém nome/email sincronizados quando o Aluno é atualizado.
     - Não altera senha se o usuário já existir para evitar derrubar sessões.
+    Só trabalha quando nome, email ou usuario mudaram (`Aluno.campos_alterados`);
+    alterações em lote devem usar `treinos.usuarios.sincronizar_usuarios_alunos`.
     """
-    username_base = _slugify_username(instance.nome)
+    alterados = instance.campos_alterados()
+    if update_fields is not None:
+        alterados &= {sender._meta.get_field(campo).attname for campo in update_fields}
+    # Sem mudancas relevantes so resta criar o usuario, se ainda faltar (e tiver sido carregado).
+    if not alterados and instance.__dict__.get("usuario_id", 0) is not None:
+        return
+
+    username_base = slugify_username(instance.nome)
     if not username_base:
         return
 
-    user = instance.usuario
-    if created or user is None:
-        username = _unique_username(username_base)
+    if created or instance.usuario_id is None:
+        first_name, last_name = nome_para_usuario(instance.nome)
         user = User.objects.create_user(
-            username=username,
+            username=_unique_username(username_base),
             email=instance.email,
-            password="123456",
-            first_name=instance.nome.split()[0] if instance.nome else "",
-            last_name=" ".join(instance.nome.split()[1:]) if instance.nome and len(instance.nome.split()) > 1 else "",
+            password=SENHA_PADRAO_ALUNO,
+            first_name=first_name,
+            last_name=last_name,
         )
+        # update() em vez de save(): nao dispara este sinal de novo.
+        Aluno.objects.filter(pk=instance.pk).update(usuario=user)
         instance.usuario = user
-        instance.save(update_fields=["usuario"])
-        _obter_grupo_aluno().user_set.add(user)
-    else:
+        user.groups.add(id_grupo_aluno())
+        return
+
+    user = instance.usuario
+    if alterados & {"nome", "email"}:
         # Atualiza dados básicos se houver divergência (mantém senha intacta).
-        changed = False
-        nome_parts = instance.nome.split()
-        first_name = nome_parts[0] if nome_parts else ""
-        last_name = " ".join(nome_parts[1:]) if len(nome_parts) > 1 else ""
-        if user.email != instance.email:
-            user.email = instance.email
-            changed = True
-        if user.first_name != first_name:
-            user.first_name = first_name
-            changed = True
-        if user.last_name != last_name:
-            user.last_name = last_name
-            changed = True
-        if changed:
+        first_name, last_name = nome_para_usuario(instance.nome)
+        if (user.email, user.first_name, user.last_name) != (instance.email, first_name, last_name):
+            user.email, user.first_name, user.last_name = instance.email, first_name, last_name
             user.save(update_fields=["email", "first_name", "last_name"])
-        _obter_grupo_aluno().user_set.add(user)
+    if "usuario_id" in alterados:
+        user.groups.add(id_grupo_aluno())
+
+
+@receiver(post_save, sender=Aluno)
+@receiver(post_delete, sender=Aluno)
+def invalidar_alunos_em_sessao(sender, instance: Aluno, **kwargs) -> None:
+    """
+    Invalida o aluno guardado na sessao pelo AlunoMiddleware so para os
+    usuarios afetados: o atual e o anterior, quando o vinculo muda. Alunos
+    sem usuario podem ser achados pelo email de qualquer um, dai a versao global.
+    """
+    if instance.usuario_id is None:
+        invalidar_versao(CHAVE_VERSAO_ALUNOS)
+        return
+    if "created" in kwargs and not kwargs["created"] and "usuario_id" not in instance.campos_alterados():
+        return
+    anterior = getattr(instance, "_estado_salvo", {}).get("usuario_id")
+    invalidar_versao(*(chave_versao_aluno_usuario(user_id) for user_id in {instance.usuario_id, anterior} if user_id))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidar_papeis_usuario(sender, instance, action: str, reverse: bool, pk_set, **kwargs) -> None:
+    """
+    Invalida os papeis em sessao quando a associacao usuario/grupo muda,
+    seja pelo usuario (admin) ou pelo grupo (`grupo.user_set.add`).
+    """
+    if action not in {"post_add", "post_remove", "post_clear"}:
+        return
+    if not reverse:
+        invalidar_versao(chave_versao_papeis_usuario(instance.pk))
+    elif pk_set:
+        invalidar_versao(*(chave_versao_papeis_usuario(user_id) for user_id in pk_set))
+    else:
+        invalidar_versao(CHAVE_VERSAO_PAPEIS)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidar_papeis(sender, **kwargs) -> None:
+    invalidar_versao(CHAVE_VERSAO_PAPEIS)
+
+
+@receiver(post_save, sender=TreinoExercicio)
+def recontar_exercicios_do_treino(sender, instance: TreinoExercicio, created: bool, **kwargs) -> None:
+    """
+    Mantem Treino.total_exercicios em dia: linhas novas contam no treino delas
+    e as que mudam de treino recontam o antigo e o novo. A exclusao direta
+    reconta em TreinoExercicio.delete().
+    """
+    anterior = getattr(instance, "_treino_salvo", None)
+    if created or anterior != instance.treino_id:
+        Treino.recontar_exercicios(*{instance.treino_id, anterior} - {None})
+
+
+@receiver(pre_delete, sender=Exercicio)
+def guardar_treinos_do_exercicio(sender, instance: Exercicio, **kwargs) -> None:
+    # Lidos antes da cascata, que apaga os TreinoExercicio sem sinais por linha.
+    instance._treinos_afetados = set(
+        TreinoExercicio.objects.filter(exercicio=instance).values_list("treino_id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Exercicio)
+def recontar_treinos_do_exercicio(sender, instance: Exercicio, **kwargs) -> None:
+    if treinos := getattr(instance, "_treinos_afetados", None):
+        Treino.recontar_exercicios(*treinos)
+
+
+@receiver(post_save, sender=Exercicio)
+@receiver(post_delete, sender=Exercicio)
+def invalidar_catalogo_exercicios(sender, **kwargs) -> None:
+    """
+    Troca a versao do catalogo em memoria (`treinos.catalogo`) de todos os
+    processos. So depois do commit: antes dele outro processo poderia
+    recarregar os dados antigos ja com a versao nova.
+    """
+    transaction.on_commit(lambda: invalidar_versao(CHAVE_VERSAO_CATALOGO))
+
+
+@receiver(post_save, sender=Aluno)
+@receiver(post_save, sender=FichaTreino)
+@receiver(post_save, sender=TreinoDiario)
+@receiver(post_delete, sender=FichaTreino)
+@receiver(post_delete, sender=TreinoDiario)
+def invalidar_treino_do_dia_do_aluno(sender, instance, **kwargs) -> None:
+    """
+    Descarta o treino do dia em cache quando o aluno, uma ficha dele ou uma
+    sessao (criada, iniciada, finalizada) muda. O progresso e gravado com
+    update() e invalidado pela propria view; TreinoProgresso fica sem
+    receptores para manter os deletes em lote rapidos.
+    """
+    # Sessoes de dias anteriores (historico, arquivamento) nao voltam ao treino
+    # do dia. As de amanha (pregeradas) invalidam: perto da meia-noite o cache
+    # ja pode estar na chave do dia delas.
+    if sender is TreinoDiario and instance.data < date.today():
+        return
+    invalidar_treino_do_dia(instance.pk if sender is Aluno else instance.aluno_id)
+
+
+@receiver(post_save, sender=TreinoDiario)
+def avancar_ponteiro_do_aluno(sender, instance: TreinoDiario, created: bool, raw: bool = False, **kwargs) -> None:
+    """
+    Avanca Aluno.proximo_treino quando uma sessao e criada por qualquer caminho
+    (view, admin, `create()`). Sessoes pregeradas so contam quando a view as
+    inicia; escritas em lote (bulk_create) nao disparam sinais e devem rodar
+    `reconstruir_proximo_treino`. Uma sessao lancada com data passada
+    recalcula o ponteiro pelo historico em vez de avancar a partir dela.
+    """
+    if not created or raw or instance.pregerado or instance.treino_id is None:
+        return
+    if instance.data < date.today():
+        atualizar_proximo_treino(instance.aluno)
+    else:
+        avancar_proximo_treino(instance.aluno, instance.treino)
+
+
+@receiver(post_save, sender=Treino)
+@receiver(post_delete, sender=Treino)
+def invalidar_treino_do_dia_da_ficha(sender, instance: Treino, **kwargs) -> None:
+    if Treino.ficha.is_cached(instance):
+        aluno_id = instance.ficha.aluno_id
+    else:
+        aluno_id = FichaTreino.objects.filter(pk=instance.ficha_id).values_list("aluno_id", flat=True).first()
+    invalidar_treino_do_dia(aluno_id)
@@ -1,5 +1,7 @@
 from django import template
 
+from treinos.utils import usuario_tem_grupo
+
 register = template.Library()
 
 
@@ -14,9 +16,7 @@ def get_item(mapping, key):
 @register.filter
 def has_group(user, group_name):
     try:
-        if group_name == "aluno" and (getattr(user, "is_superuser", False) or getattr(user, "is_staff", False)):
-            return False
-        return user.groups.filter(name=group_name).exists()
+        return usuario_tem_grupo(user, group_name)
     except Exception:
         return False
 
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import unittest
+
+from django.db import connection
+from django.test import TestCase
+
+from treinos import planos
+
+# Indice que cada consulta deve usar; uma regressao aqui volta a varrer a tabela em producao.
+INDICES_ESPERADOS = {
+    "calcular_proximo_treino": "ficha_ativa_unica_por_aluno",
+    "selecionar_treino_do_dia": "ficha_ativa_unica_por_aluno",
+    "historico_treinos": "treinodiario_aluno_final_idx",
+    "lista_treinos": "treinodiario_listagem_idx",
+    "lista_treinos (busca)": "treinodiario_aluno_final_idx",
+    "lista_fichas (data_criacao asc)": "ficha_data_criacao_idx",
+    "lista_fichas (data_criacao desc)": "ficha_data_criacao_idx",
+    "lista_fichas (nome asc)": "ficha_nome_idx",
+    "lista_fichas (nome desc)": "ficha_nome_idx",
+    "volume_semanal": "volumesemanal_semana_grupo_idx",
+}
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN so existe no SQLite.")
+class PlanosConsultaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instrutor, cls.aluno = planos.criar_dados_de_apoio()
+
+    def setUp(self):
+        consultas = planos.capturar_consultas(self.instrutor, self.aluno, host="testserver")
+        self.planos = [(origem, sql, planos.plano(sql)) for origem, sql in consultas]
+
+    def test_nenhuma_varredura_completa(self):
+        for origem, sql, passos in self.planos:
+            with self.subTest(origem=origem, sql=sql):
+                self.assertEqual(planos.varreduras_completas(sql, passos), [])
+
+    def test_consultas_usam_os_indices_esperados(self):
+        for origem, indice in INDICES_ESPERADOS.items():
+            with self.subTest(origem=origem):
+                passos = [passo for nome, _sql, plano in self.planos if nome == origem for passo in plano]
+                self.assertTrue(passos, f"{origem} nao executou nenhuma consulta nas tabelas do app.")
+                self.assertTrue(
+                    any(f"INDEX {indice}" in passo for passo in passos),
+                    f"{origem} nao usa {indice}:\n  " + "\n  ".join(passos),
+                )
+
+    def test_filtro_na_tabela_impede_varredura_limitada(self):
+        sql = 'SELECT * FROM "treinos_treino" WHERE "treinos_treino"."nome" = %s LIMIT 1'
+        self.assertEqual(planos.varreduras_completas(sql, ["SCAN treinos_treino"]), ["SCAN treinos_treino"])
+        sql = 'SELECT * FROM "treinos_treino" LIMIT 1'
+        self.assertEqual(planos.varreduras_completas(sql, ["SCAN treinos_treino"]), [])
@@ -3,12 +3,14 @@ from django.urls import path
 from alunos import views as alunos_views
 from exercicios import views as exercicios_views
 from fichas import views as fichas_views
+from treinos import views as treinos_views
 
 app_name = "treinos"
 
 urlpatterns = [
     path("", alunos_views.lista_alunos, name="lista_alunos"),
     path("alunos/novo/", alunos_views.aluno_create, name="aluno_create"),
+    path("alunos/importar/", alunos_views.aluno_importar, name="aluno_importar"),
     path("alunos/<int:pk>/editar/", alunos_views.aluno_update, name="aluno_update"),
     path("alunos/<int:pk>/excluir/", alunos_views.aluno_delete, name="aluno_delete"),
     path("exercicios/", exercicios_views.lista_exercicios, name="lista_exercicios"),
@@ -25,6 +27,11 @@ urlpatterns = [
     path("historico/", fichas_views.historico_treinos, name="historico"),
     path("historico/<int:pk>/", fichas_views.detalhes_treino, name="detalhes_treino"),
     path("lista-treinos/", fichas_views.lista_treinos, name="lista_treinos"),
+    path("lista-treinos/exportar/", fichas_views.exportar_treinos, name="exportar_treinos"),
     path("lista-fichas/", fichas_views.lista_fichas, name="lista_fichas"),
+    path("lista-fichas/exportar/", fichas_views.exportar_fichas, name="exportar_fichas"),
+    path("progresso/", treinos_views.progresso, name="progresso"),
+    path("volume/", treinos_views.volume_semanal, name="volume_semanal"),
+    path("desempenho/", treinos_views.desempenho, name="desempenho"),
 ]
 
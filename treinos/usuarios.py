@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import re
+from functools import reduce
+from operator import or_
+from typing import Iterable
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models import Q
+
+from treinos.models import Aluno
+from treinos.utils import CHAVE_VERSAO_ALUNOS, CHAVE_VERSAO_PAPEIS, em_lotes, invalidar_versao
+
+User = get_user_model()
+
+# Senha inicial de todo usuario criado para um aluno.
+SENHA_PADRAO_ALUNO = "123456"
+# Limite de ORs por consulta de usernames (o SQLite recusa expressoes muito profundas).
+BASES_POR_CONSULTA = 200
+
+
+def slugify_username(nome: str) -> str:
+    partes = (nome or "").strip().lower().split()
+    if not partes:
+        return ""
+    if len(partes) == 1:
+        return partes[0]
+    return f"{partes[0]}.{partes[-1]}"
+
+
+def nome_para_usuario(nome: str) -> tuple[str, str]:
+    """
+    Divide o nome do aluno em (first_name, last_name).
+    """
+    partes = (nome or "").split()
+    return (partes[0] if partes else "", " ".join(partes[1:]))
+
+
+def id_grupo_aluno() -> int:
+    """
+    Id do grupo `aluno` (uma consulta indexada por chamada). Nao fica em cache
+    no processo: um grupo criado numa transacao desfeita deixaria um id invalido.
+    """
+    grupo, _ = Group.objects.get_or_create(name="aluno")
+    return grupo.pk
+
+
+def alocar_usernames(nomes: list[str]) -> list[str]:
+    """
+    Usernames no esquema `nome.sobrenome`, `nome.sobrenome1`, ... buscando os
+    ja ocupados de todas as bases em poucas consultas.
+    """
+    bases = [slugify_username(nome) for nome in nomes]
+    ocupados: dict[str, set[str]] = {base: set() for base in bases}
+    for lote in em_lotes(ocupados, BASES_POR_CONSULTA):
+        filtro = reduce(or_, (Q(username__startswith=base) for base in lote))
+        for username in User.objects.filter(filtro).values_list("username", flat=True):
+            for base in lote:
+                if username == base or re.fullmatch(rf"{re.escape(base)}\d+", username):
+                    ocupados[base].add(username)
+
+    usernames = []
+    contadores: dict[str, int] = {}
+    for base in bases:
+        usados = ocupados[base]
+        candidato = base
+        contador = contadores.get(base, 0)
+        while candidato in usados:
+            contador += 1
+            candidato = f"{base}{contador}"
+        contadores[base] = contador
+        usados.add(candidato)
+        usernames.append(candidato)
+    return usernames
+
+
+def sincronizar_usuarios_alunos(alunos: Iterable[Aluno], chunk_size: int = 500) -> dict[str, int]:
+    """
+    Versao em lote do sinal de sincronizacao, para alunos alterados por
+    `update()`/`bulk_update()` ou scripts: cria os usuarios que faltam, alinha
+    email/nome dos existentes e garante o grupo `aluno`, com algumas consultas
+    por lote em vez de varias por aluno.
+    """
+    totais = {"criados": 0, "atualizados": 0}
+    grupo_id = id_grupo_aluno()
+    senha = None
+    for lote in em_lotes(alunos, chunk_size):
+        lote = [aluno for aluno in lote if slugify_username(aluno.nome)]
+        sem_usuario = [aluno for aluno in lote if aluno.usuario_id is None]
+        usuarios = User.objects.in_bulk([aluno.usuario_id for aluno in lote if aluno.usuario_id])
+
+        alterados = []
+        for aluno in lote:
+            usuario = usuarios.get(aluno.usuario_id)
+            if usuario is None:
+                continue
+            first_name, last_name = nome_para_usuario(aluno.nome)
+            if (usuario.email, usuario.first_name, usuario.last_name) != (aluno.email, first_name, last_name):
+                usuario.email, usuario.first_name, usuario.last_name = aluno.email, first_name, last_name
+                alterados.append(usuario)
+
+        with transaction.atomic():
+            User.objects.bulk_update(alterados, ["email", "first_name", "last_name"])
+            if sem_usuario:
+                senha = senha or make_password(SENHA_PADRAO_ALUNO)
+                usernames = alocar_usernames([aluno.nome for aluno in sem_usuario])
+                novos = User.objects.bulk_create(
+                    [
+                        User(
+                            username=username,
+                            email=aluno.email,
+                            password=senha,
+                            first_name=nome_para_usuario(aluno.nome)[0],
+                            last_name=nome_para_usuario(aluno.nome)[1],
+                        )
+                        for aluno, username in zip(sem_usuario, usernames)
+                    ]
+                )
+                for aluno, usuario in zip(sem_usuario, novos):
+                    aluno.usuario = usuario
+                Aluno.objects.bulk_update(sem_usuario, ["usuario"])
+            User.groups.through.objects.bulk_create(
+                [User.groups.through(user_id=aluno.usuario_id, group_id=grupo_id) for aluno in lote],
+                ignore_conflicts=True,
+            )
+        totais["criados"] += len(sem_usuario)
+        totais["atualizados"] += len(alterados)
+
+    # bulk_create/bulk_update nao disparam sinais: invalida papeis e alunos em sessao.
+    invalidar_versao(CHAVE_VERSAO_PAPEIS, CHAVE_VERSAO_ALUNOS)
+    return totais
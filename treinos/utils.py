@@ -1,28 +1,150 @@
 from __future__ import annotations
 
+import json
+import time
 from datetime import date
 from functools import wraps
+from itertools import islice
+from typing import Iterable, Iterator, Mapping, Sequence
 
 from django.contrib import messages
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
 from django.http import HttpRequest
 from django.shortcuts import redirect
 from django.utils.translation import gettext_lazy as _
 
-from treinos.models import Aluno, Exercicio, FichaTreino, Treino, TreinoDiario, TreinoProgresso
+from treinos.models import Aluno, Exercicio, FichaTreino, Treino, TreinoDiario, TreinoExercicio, TreinoProgresso
 
 
-def usuario_eh_aluno(user) -> bool:
+CHAVE_VERSAO_ALUNOS = "treinos:alunos:versao"
+CHAVE_VERSAO_PAPEIS = "treinos:papeis:versao"
+CHAVE_VERSAO_CATALOGO = "treinos:catalogo:versao"
+CHAVE_VERSAO_TREINO_DO_DIA = "treinos:treino_do_dia:versao"
+CHAVE_TREINO_DO_DIA = "treinos:treino_do_dia"
+TEMPO_TREINO_DO_DIA = 60 * 60 * 24
+SESSAO_ALUNO = "treinos_aluno"
+SESSAO_PAPEIS = "treinos_papeis"
+
+
+def obter_versao(chave: str) -> int:
+    """
+    Le um carimbo de versao guardado no cache do Django (compartilhado entre
+    processos). Caches em sessao ou em memoria comparam esse carimbo para
+    saber se ainda sao validos.
+    """
+    versao = cache.get(chave)
+    if versao is None:
+        cache.add(chave, time.time_ns(), timeout=None)
+        versao = cache.get(chave)
+    return versao
+
+
+def invalidar_versao(*chaves: str) -> None:
+    versao = time.time_ns()
+    cache.set_many({chave: versao for chave in chaves}, timeout=None)
+
+
+def chave_versao_papeis_usuario(user_id: int) -> str:
+    return f"{CHAVE_VERSAO_PAPEIS}:{user_id}"
+
+
+def chave_versao_aluno_usuario(user_id: int) -> str:
+    return f"{CHAVE_VERSAO_ALUNOS}:{user_id}"
+
+
+def _versao_aluno(user_id: int) -> list[int]:
+    return [obter_versao(CHAVE_VERSAO_ALUNOS), obter_versao(chave_versao_aluno_usuario(user_id))]
+
+
+def chave_versao_treino_do_dia(aluno_id: int) -> str:
+    return f"{CHAVE_VERSAO_TREINO_DO_DIA}:{aluno_id}"
+
+
+def invalidar_treino_do_dia(*aluno_ids: int | None) -> None:
+    """
+    Descarta o treino do dia em cache dos alunos depois do commit da transacao
+    corrente (na hora, fora de uma): antes dele outra requisicao poderia
+    recalcular o contexto com os dados antigos e guarda-lo com a versao nova.
+    """
+    chaves = [chave_versao_treino_do_dia(aluno_id) for aluno_id in aluno_ids if aluno_id]
+    if chaves:
+        transaction.on_commit(lambda: invalidar_versao(*chaves))
+
+
+def versao_treino_do_dia(aluno_id: int) -> list[int]:
+    """
+    Versoes que validam o contexto em cache: a do aluno e a do catalogo de
+    exercicios (nomes exibidos na pagina). Deve ser lida antes de montar o contexto.
+    """
+    return [obter_versao(chave_versao_treino_do_dia(aluno_id)), obter_versao(CHAVE_VERSAO_CATALOGO)]
+
+
+def _chave_treino_do_dia(aluno_id: int) -> str:
+    return f"{CHAVE_TREINO_DO_DIA}:{aluno_id}:{date.today().isoformat()}"
+
+
+def ler_treino_do_dia(aluno_id: int) -> dict | None:
+    em_cache = cache.get(_chave_treino_do_dia(aluno_id))
+    if em_cache and em_cache["versao"] == versao_treino_do_dia(aluno_id):
+        return em_cache["contexto"]
+    return None
+
+
+def guardar_treino_do_dia(aluno_id: int, versao: list[int], contexto: dict) -> None:
+    """
+    Guarda o contexto do treino do dia (objetos ja carregados, sem querysets)
+    com as versoes lidas antes de monta-lo; a chave muda a cada dia.
+    """
+    cache.set(_chave_treino_do_dia(aluno_id), {"versao": versao, "contexto": contexto}, TEMPO_TREINO_DO_DIA)
+
+
+def obter_papeis(user, session=None) -> frozenset[str]:
+    """
+    Nomes dos grupos do usuario, consultados no maximo uma vez por requisicao.
+
+    O resultado fica memorizado no proprio objeto do usuario e, quando a
+    sessao e informada, tambem na sessao junto com as versoes global e do
+    usuario; os sinais de grupos invalidam essas versoes.
+    """
     if not user.is_authenticated:
+        return frozenset()
+    papeis = getattr(user, "_papeis_gymtrack", None)
+    if papeis is not None:
+        return papeis
+
+    versao = [obter_versao(CHAVE_VERSAO_PAPEIS), obter_versao(chave_versao_papeis_usuario(user.pk))]
+    em_cache = session.get(SESSAO_PAPEIS) if session is not None else None
+    if em_cache and em_cache["usuario"] == user.pk and em_cache["versao"] == versao:
+        papeis = frozenset(em_cache["grupos"])
+    else:
+        papeis = frozenset(user.groups.values_list("name", flat=True))
+        if session is not None:
+            session[SESSAO_PAPEIS] = {"usuario": user.pk, "versao": versao, "grupos": sorted(papeis)}
+    user._papeis_gymtrack = papeis
+    return papeis
+
+
+def usuario_tem_grupo(user, grupo: str, session=None) -> bool:
+    if grupo == "aluno" and (getattr(user, "is_superuser", False) or getattr(user, "is_staff", False)):
         return False
-    if getattr(user, "is_superuser", False) or getattr(user, "is_staff", False):
+    return grupo in obter_papeis(user, session)
+
+
+def usuario_eh_aluno(user, session=None) -> bool:
+    if not user.is_authenticated:
         return False
-    return user.groups.filter(name="aluno").exists()
+    return usuario_tem_grupo(user, "aluno", session)
 
 
 def bloquear_para_aluno(view_func):
     @wraps(view_func)
     def _wrapped(request: HttpRequest, *args, **kwargs):
-        if usuario_eh_aluno(request.user):
+        if usuario_eh_aluno(request.user, request.session):
             messages.error(request, _("Voce nao tem permissao para acessar este modulo."))
             return redirect("treinos:treino_do_dia")
         return view_func(request, *args, **kwargs)
@@ -31,57 +153,275 @@ def bloquear_para_aluno(view_func):
 
 
 def obter_aluno_logado(user) -> Aluno | None:
+    """
+    Busca o Aluno vinculado ao usuario pelo OneToOne `Aluno.usuario`.
+    Cadastros antigos, sem usuario vinculado, ainda sao encontrados pelo email.
+    """
     if not user.is_authenticated:
         return None
+    aluno = Aluno.objects.filter(usuario_id=user.pk).first()
+    if aluno:
+        return aluno
     email = user.email or user.username
     if not email:
         return None
-    try:
-        return Aluno.objects.get(email__iexact=email)
-    except Aluno.DoesNotExist:
+    return Aluno.objects.filter(usuario__isnull=True, email__iexact=email).first()
+
+
+def aluno_id_em_sessao(request: HttpRequest) -> int | None:
+    """
+    Id do aluno guardado na sessao por `resolver_aluno`, sem consultar o banco.
+    None quando a sessao ainda nao o tem ou a versao de alunos do usuario mudou.
+    """
+    if not request.user.is_authenticated:
         return None
+    em_cache = request.session.get(SESSAO_ALUNO)
+    if em_cache and em_cache["usuario"] == request.user.pk and em_cache["versao"] == _versao_aluno(request.user.pk):
+        return em_cache["aluno"]
+    return None
 
 
-def preparar_progresso(treino_diario: TreinoDiario) -> None:
-    for treino_exercicio in treino_diario.treino.exercicios.all():
-        TreinoProgresso.objects.get_or_create(
-            treino_diario=treino_diario,
-            exercicio=treino_exercicio.exercicio,
-        )
+def resolver_aluno(request: HttpRequest) -> Aluno | None:
+    """
+    Resolve o aluno da requisicao guardando o id na sessao, junto com as
+    versoes global e do usuario (os sinais de Aluno invalidam a do usuario
+    afetado; importacoes em lote, a global). Com o id em sessao o aluno sai
+    por pk, o treino do dia usa o id sem consultar nada, e usuarios sem
+    aluno (ou de cadastros antigos, achados pelo email) nao repetem a busca.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return None
 
+    versao = _versao_aluno(user.pk)
+    em_cache = request.session.get(SESSAO_ALUNO)
+    if em_cache and em_cache["usuario"] == user.pk and em_cache["versao"] == versao:
+        if em_cache["aluno"] is None:
+            return None
+        aluno = Aluno.objects.filter(pk=em_cache["aluno"]).first()
+        if aluno:
+            return aluno
 
-def selecionar_treino_do_dia(aluno: Aluno) -> Treino | None:
-    ficha = (
-        FichaTreino.objects.filter(aluno=aluno, ativa=True)
-        .order_by("-data_criacao")
-        .prefetch_related("treinos")
-        .first()
+    aluno = obter_aluno_logado(user)
+    request.session[SESSAO_ALUNO] = {"usuario": user.pk, "versao": versao, "aluno": aluno.pk if aluno else None}
+    return aluno
+
+
+def preparar_progresso(
+    treino_diario: TreinoDiario,
+    *,
+    exercicio_ids: Iterable[int] | None = None,
+    existentes: Iterable[int] | None = None,
+) -> int:
+    """
+    Garante uma linha de TreinoProgresso para cada exercicio do treino.
+
+    Le os exercicios ja semeados em uma unica consulta e insere somente os
+    faltantes com um bulk_create (conflitos ignorados). Quem ja tiver os ids
+    em maos pode informa-los em `exercicio_ids`/`existentes` para evitar as
+    leituras; se a sessao ja estiver completa nada e escrito.
+    Retorna quantas linhas foram criadas.
+    """
+    if treino_diario.treino_id is None:
+        return 0
+    if exercicio_ids is None:
+        exercicio_ids = TreinoExercicio.objects.filter(treino_id=treino_diario.treino_id).values_list(
+            "exercicio_id", flat=True
+        )
+    if existentes is None:
+        existentes = TreinoProgresso.objects.filter(treino_diario=treino_diario).values_list("exercicio_id", flat=True)
+
+    faltantes = set(exercicio_ids) - set(existentes)
+    if not faltantes:
+        return 0
+    TreinoProgresso.objects.bulk_create(
+        [TreinoProgresso(treino_diario=treino_diario, exercicio_id=exercicio_id) for exercicio_id in sorted(faltantes)],
+        ignore_conflicts=True,
     )
+    return len(faltantes)
+
+
+def salvar_progresso(progresso_map: dict[int, TreinoProgresso], selecionados: set[int]) -> int:
+    """
+    Grava o estado `concluido` enviado pelo formulario do treino do dia.
+
+    Compara os exercicios selecionados com o estado atual do mapa e atualiza
+    apenas o que mudou, com no maximo dois UPDATEs (marcar e desmarcar).
+    O mapa em memoria e ajustado para refletir o novo estado.
+    Retorna quantas linhas foram alteradas.
+    """
+    marcar = [item for item in progresso_map.values() if not item.concluido and item.exercicio_id in selecionados]
+    desmarcar = [item for item in progresso_map.values() if item.concluido and item.exercicio_id not in selecionados]
+
+    for itens, concluido in ((marcar, True), (desmarcar, False)):
+        if not itens:
+            continue
+        TreinoProgresso.objects.filter(pk__in=[item.pk for item in itens]).update(concluido=concluido)
+        for item in itens:
+            item.concluido = concluido
+    return len(marcar) + len(desmarcar)
+
+
+def _segundos(duracao) -> int | None:
+    return None if duracao is None else round(duracao.total_seconds())
+
+
+def montar_resumo(
+    treino_diario: TreinoDiario,
+    treino_exercicios: Iterable[TreinoExercicio] | None = None,
+    concluidos: Iterable[int] | None = None,
+) -> dict:
+    """
+    Foto compacta da sessao guardada em `TreinoDiario.resumo` ao finalizar:
+    treino, ficha e aluno, exercicios (nome, grupo, series, repeticoes,
+    concluido) e tempos em segundos. Espera `treino__ficha__aluno` carregado;
+    sem `treino_exercicios`/`concluidos` le os dois do banco, sem escrever nada.
+    """
+    treino = treino_diario.treino
+    if treino_exercicios is None:
+        treino_exercicios = treino.exercicios.select_related("exercicio") if treino else []
+    if concluidos is None:
+        from treinos.compactacao import progresso_das_sessoes
+
+        progresso = progresso_das_sessoes([treino_diario])[treino_diario.pk]
+        concluidos = [exercicio_id for exercicio_id, concluido in progresso.items() if concluido]
+    concluidos = set(concluidos)
+    return {
+        "versao": 1,
+        "treino": treino.nome if treino else "",
+        "ficha": str(treino.ficha) if treino else "",
+        "aluno": treino_diario.aluno.nome,
+        "exercicios": [
+            {
+                "id": item.exercicio_id,
+                "nome": item.exercicio.nome,
+                "grupo": item.exercicio.grupo_muscular,
+                "series": item.series,
+                "repeticoes": item.repeticoes,
+                "concluido": item.exercicio_id in concluidos,
+            }
+            for item in treino_exercicios
+        ],
+        "tempo_total": _segundos(treino_diario.tempo_total),
+        "tempo_medio_exercicio": _segundos(treino_diario.tempo_medio_exercicio),
+    }
+
+
+def montar_resumos(sessoes: Sequence[TreinoDiario]) -> None:
+    """
+    `montar_resumo` em lote: preenche `resumo` das sessoes (em memoria, sem
+    gravar) com os exercicios atuais de cada treino e o progresso salvo, em
+    duas consultas. As sessoes devem vir com `aluno` e `treino__ficha__aluno`.
+    """
+    from treinos.compactacao import progresso_das_sessoes
+
+    itens_por_treino: dict[int, list[TreinoExercicio]] = {}
+    for item in TreinoExercicio.objects.filter(
+        treino_id__in={sessao.treino_id for sessao in sessoes if sessao.treino_id}
+    ).select_related("exercicio"):
+        itens_por_treino.setdefault(item.treino_id, []).append(item)
+
+    progresso = progresso_das_sessoes(sessoes)
+    for sessao in sessoes:
+        concluidos = [exercicio_id for exercicio_id, concluido in progresso[sessao.pk].items() if concluido]
+        sessao.resumo = montar_resumo(sessao, itens_por_treino.get(sessao.treino_id, []), concluidos)
+
+
+def proximo_na_rotacao(treinos: Sequence[Treino], atual: Treino | None) -> Treino | None:
+    """
+    Dado os treinos de uma ficha (ordenados por `ordem`) e o ultimo treino
+    executado, devolve o proximo da rotacao, voltando ao primeiro no fim.
+    """
+    if not treinos:
+        return None
+    if atual is not None and atual.ficha_id == treinos[0].ficha_id:
+        for treino in treinos:
+            if treino.ordem > atual.ordem:
+                return treino
+    return treinos[0]
+
+
+def calcular_proximo_treino(aluno: Aluno) -> Treino | None:
+    """
+    Recalcula o proximo treino a partir da ficha ativa e do historico do aluno.
+    """
+    ficha = FichaTreino.objects.filter(aluno=aluno, ativa=True).order_by("-data_criacao").first()
     if not ficha:
         return None
-    if not ficha.treinos.exists():
-        treino = Treino.objects.create(ficha=ficha, nome="A", ordem=1)
-        return treino
+    treinos = list(ficha.treinos.order_by("ordem"))
+    if not treinos:
+        return Treino.objects.create(ficha=ficha, nome="A", ordem=1)
 
     ultimo = (
-        TreinoDiario.objects.filter(aluno=aluno)
-        .select_related("treino", "treino__ficha")
-        .order_by("-data")
-        .first()
+        TreinoDiario.objects.filter(aluno=aluno, pregerado=False).select_related("treino").order_by("-data").first()
     )
-    if not ultimo or ultimo.treino.ficha_id != ficha.id:
-        return ficha.treinos.order_by("ordem").first()
+    return proximo_na_rotacao(treinos, ultimo.treino if ultimo else None)
+
+
+def atualizar_proximo_treino(aluno: Aluno) -> Treino | None:
+    """
+    Repara o ponteiro `Aluno.proximo_treino` apos mudancas na rotacao.
+    Usa update() para nao disparar a sincronizacao de usuario do post_save.
+    """
+    treino = calcular_proximo_treino(aluno)
+    Aluno.objects.filter(pk=aluno.pk).update(proximo_treino=treino)
+    aluno.proximo_treino = treino
+    return treino
 
-    prox = ficha.treinos.filter(ordem__gt=ultimo.treino.ordem).order_by("ordem").first()
-    return prox or ficha.treinos.order_by("ordem").first()
+
+def avancar_proximo_treino(aluno: Aluno, executado: Treino) -> Treino | None:
+    """
+    Avanca o ponteiro do aluno para o treino seguinte ao que acabou de ser
+    agendado em um TreinoDiario. Chamada pelo post_save de TreinoDiario e
+    pela view ao iniciar uma sessao pregerada.
+    """
+    treino = proximo_na_rotacao(list(Treino.objects.filter(ficha_id=executado.ficha_id).order_by("ordem")), executado)
+    Aluno.objects.filter(pk=aluno.pk).update(proximo_treino=treino)
+    aluno.proximo_treino = treino
+    return treino
+
+
+def selecionar_treino_do_dia(aluno: Aluno) -> Treino | None:
+    """
+    Resolve o treino de hoje pelo ponteiro materializado em uma unica consulta.
+    Se o ponteiro estiver vazio ou apontar para uma ficha que deixou de estar
+    ativa, ele e recalculado a partir do historico.
+    """
+    if aluno.proximo_treino_id:
+        treino = (
+            Treino.objects.select_related("ficha")
+            .filter(pk=aluno.proximo_treino_id, ficha__aluno_id=aluno.pk, ficha__ativa=True)
+            .first()
+        )
+        if treino:
+            return treino
+    return atualizar_proximo_treino(aluno)
+
+
+def em_lotes(iteravel: Iterable, tamanho: int) -> Iterator[list]:
+    """
+    Agrupa um iteravel em listas de ate `tamanho` itens (usado pelos comandos em lote).
+    """
+    iterador = iter(iteravel)
+    while lote := list(islice(iterador, tamanho)):
+        yield lote
 
 
 def listar_grupos_musculares() -> list[str]:
-    return list(
-        Exercicio.objects.order_by("grupo_muscular")
-        .values_list("grupo_muscular", flat=True)
-        .distinct()
-    )
+    from treinos.catalogo import obter_catalogo
+
+    return list(obter_catalogo().grupos_musculares)
+
+
+def _ler_ordenacao(request: HttpRequest, allowed_fields, default_field: str, default_direction: str) -> tuple[str, str]:
+    sort_field = request.GET.get("ordenar") or default_field
+    if sort_field not in allowed_fields:
+        sort_field = default_field
+
+    direction = request.GET.get("direcao") or default_direction
+    if direction not in {"asc", "desc"}:
+        direction = default_direction
+    return sort_field, direction
 
 
 def ordenar_e_paginar(
@@ -95,15 +435,149 @@ def ordenar_e_paginar(
 ):
     from django.core.paginator import Paginator
 
-    sort_field = request.GET.get("ordenar") or default_field
-    if sort_field not in allowed_fields:
-        sort_field = default_field
-
-    direction = request.GET.get("direcao") or default_direction
-    if direction not in {"asc", "desc"}:
-        direction = default_direction
-
+    sort_field, direction = _ler_ordenacao(request, allowed_fields, default_field, default_direction)
     ordering = sort_field if direction == "asc" else f"-{sort_field}"
     paginator = Paginator(queryset.order_by(ordering), per_page)
     page_obj = paginator.get_page(request.GET.get("page"))
     return page_obj, sort_field, direction
+
+
+class PaginaCursor:
+    """
+    Pagina de uma listagem paginada por cursor (keyset). Imita o suficiente de
+    `django.core.paginator.Page` para os templates: iteracao, `object_list`,
+    `has_next`/`has_previous`, alem dos tokens opacos dos cursores vizinhos.
+    """
+
+    def __init__(
+        self,
+        object_list: list,
+        *,
+        next_cursor: str | None,
+        previous_cursor: str | None,
+        query: str,
+        total: int | None = None,
+        total_excede: bool = False,
+    ):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.query = query
+        self.total = total
+        self.total_excede = total_excede
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+
+class _SerializadorCursor(signing.JSONSerializer):
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(",", ":"), cls=DjangoJSONEncoder).encode("latin-1")
+
+
+def _campo_ordenavel(model, caminho: str):
+    opts = model._meta
+    for parte in caminho.split("__"):
+        campo = opts.get_field(parte)
+        if campo.is_relation:
+            opts = campo.related_model._meta
+    return campo
+
+
+def _gerar_cursor(objeto, caminho: str, direcao: str, sentido: str) -> str:
+    valor = objeto
+    for parte in caminho.split("__"):
+        valor = getattr(valor, parte)
+    payload = {"campo": caminho, "direcao": direcao, "sentido": sentido, "pk": objeto.pk, "valor": valor}
+    return signing.dumps(payload, salt="treinos.cursor", serializer=_SerializadorCursor, compress=True)
+
+
+def _ler_cursor(token: str | None, model, caminho: str, direcao: str) -> dict | None:
+    if not token:
+        return None
+    try:
+        payload = signing.loads(token, salt="treinos.cursor", serializer=_SerializadorCursor)
+    except signing.BadSignature:
+        return None
+    if payload.get("campo") != caminho or payload.get("direcao") != direcao:
+        return None
+    try:
+        payload["valor"] = _campo_ordenavel(model, caminho).to_python(payload["valor"])
+    except ValidationError:
+        return None
+    return payload
+
+
+def paginar_por_cursor(
+    request: HttpRequest,
+    queryset,
+    allowed_fields: Mapping[str, str] | tuple[str, ...],
+    default_field: str,
+    *,
+    default_direction: str = "asc",
+    per_page: int = 10,
+    contar_ate: int | None = None,
+):
+    """
+    Versao de `ordenar_e_paginar` para tabelas grandes: pagina por cursor
+    (WHERE campo > ultimo valor, desempate por pk) em vez de OFFSET, e nao
+    executa COUNT(*) completo. `allowed_fields` pode mapear o nome usado na
+    URL para o caminho do ORM (ex.: {"aluno": "aluno__nome"}); os campos
+    precisam ser NOT NULL. Com `contar_ate`, o total e contado ate esse
+    limite e `total_excede` indica que ha mais registros.
+    """
+    if not isinstance(allowed_fields, Mapping):
+        allowed_fields = {field: field for field in allowed_fields}
+    sort_field, direction = _ler_ordenacao(request, allowed_fields, default_field, default_direction)
+    caminho = allowed_fields[sort_field]
+
+    cursor = _ler_cursor(request.GET.get("cursor"), queryset.model, caminho, direction)
+    voltando = bool(cursor) and cursor["sentido"] == "anterior"
+    crescente = (direction == "asc") != voltando
+
+    paginada = queryset.order_by(caminho, "pk") if crescente else queryset.order_by(f"-{caminho}", "-pk")
+    if cursor:
+        operador = "gt" if crescente else "lt"
+        paginada = paginada.filter(
+            Q(**{f"{caminho}__{operador}": cursor["valor"]})
+            | Q(**{caminho: cursor["valor"], f"pk__{operador}": cursor["pk"]})
+        )
+    itens = list(paginada[: per_page + 1])
+    mais_itens = len(itens) > per_page
+    itens = itens[:per_page]
+    if voltando:
+        itens.reverse()
+
+    tem_proxima = mais_itens if not voltando else True
+    tem_anterior = bool(cursor) if not voltando else mais_itens
+
+    total = None
+    total_excede = False
+    if contar_ate:
+        total = queryset.order_by()[: contar_ate + 1].count()
+        total_excede = total > contar_ate
+        total = min(total, contar_ate)
+
+    query = request.GET.copy()
+    query.pop("cursor", None)
+    query.pop("page", None)
+    page_obj = PaginaCursor(
+        itens,
+        next_cursor=_gerar_cursor(itens[-1], caminho, direction, "proxima") if itens and tem_proxima else None,
+        previous_cursor=_gerar_cursor(itens[0], caminho, direction, "anterior") if itens and tem_anterior else None,
+        query=query.urlencode(),
+        total=total,
+        total_excede=total_excede,
+    )
+    return page_obj, sort_field, direction
@@ -1,3 +1,99 @@
+from datetime import date, timedelta
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.db.models import Count, Sum
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.views.decorators.http import require_http_methods
+
 from alunos.views import *  # noqa: F401,F403
 from exercicios.views import *  # noqa: F401,F403
 from fichas.views import *  # noqa: F401,F403
+from treinos.desempenho import agregador
+from treinos.models import Aluno, VolumeSemanal
+from treinos.utils import bloquear_para_aluno
+from treinos.volume import agrupar_por_semana, inicio_da_semana
+
+SEMANAS_VOLUME = 12
+# A visao do instrutor soma todos os alunos: janela padrao menor e limitada.
+SEMANAS_VOLUME_INSTRUTOR = 4
+MAX_SEMANAS_INSTRUTOR = 12
+
+
+@staff_member_required
+@require_http_methods(["GET", "POST"])
+def desempenho(request: HttpRequest) -> JsonResponse:
+    """
+    Agregados do DesempenhoMiddleware deste processo, por nome de rota.
+    POST zera os agregados.
+    """
+    if request.method == "POST":
+        agregador.limpar()
+    return JsonResponse({"rotas": agregador.resumo()})
+
+
+def _semanas(request: HttpRequest, padrao: int = SEMANAS_VOLUME, maximo: int = 52) -> int:
+    try:
+        return min(max(int(request.GET.get("semanas", padrao)), 1), maximo)
+    except ValueError:
+        return padrao
+
+
+@login_required
+def progresso(request: HttpRequest) -> HttpResponse:
+    """
+    Volume das ultimas semanas do aluno logado, lido so de VolumeSemanal.
+    """
+    aluno = request.aluno
+    if not aluno:
+        return render(request, "progresso.html", {"mensagem": "Nenhum aluno vinculado a este usuario."})
+    semanas = _semanas(request)
+    desde = inicio_da_semana(date.today()) - timedelta(weeks=semanas - 1)
+    linhas = (
+        VolumeSemanal.objects.filter(aluno=aluno, semana__gte=desde)
+        .order_by("-semana", "grupo_muscular")
+        .values("semana", "grupo_muscular", "sessoes", "exercicios_concluidos", "volume", "tempo_total")
+    )
+    return render(request, "progresso.html", {"semanas": agrupar_por_semana(linhas), "quantidade_semanas": semanas})
+
+
+@login_required
+@bloquear_para_aluno
+def volume_semanal(request: HttpRequest) -> HttpResponse:
+    """
+    Visao do instrutor: volume por semana e grupo muscular de todos os alunos
+    (ou de um, com `?aluno=<id>`) e o ranking da semana mais recente.
+    """
+    semanas = _semanas(request, SEMANAS_VOLUME_INSTRUTOR, MAX_SEMANAS_INSTRUTOR)
+    desde = inicio_da_semana(date.today()) - timedelta(weeks=semanas - 1)
+    volumes = VolumeSemanal.objects.filter(semana__gte=desde)
+    aluno = None
+    if (aluno_id := request.GET.get("aluno", "")).isdigit():
+        aluno = get_object_or_404(Aluno, pk=aluno_id)
+        volumes = volumes.filter(aluno=aluno)
+
+    linhas = (
+        volumes.values("semana", "grupo_muscular")
+        .annotate(
+            sessoes=Sum("sessoes"),
+            exercicios_concluidos=Sum("exercicios_concluidos"),
+            volume=Sum("volume"),
+            tempo_total=Sum("tempo_total"),
+            alunos=Count("aluno", distinct=True),
+        )
+        .order_by("-semana", "grupo_muscular")
+    )
+    por_semana = agrupar_por_semana(linhas)
+
+    ranking = []
+    if por_semana and aluno is None:
+        ranking = (
+            volumes.filter(semana=por_semana[0]["semana"])
+            .values("aluno_id", "aluno__nome")
+            .annotate(volume=Sum("volume"), exercicios_concluidos=Sum("exercicios_concluidos"))
+            .order_by("-volume")[:20]
+        )
+
+    contexto = {"semanas": por_semana, "ranking": ranking, "aluno": aluno, "quantidade_semanas": semanas}
+    return render(request, "volume_semanal.html", contexto)
@@ -0,0 +1,221 @@
+"""
+Volume semanal por aluno e grupo muscular (modelo VolumeSemanal).
+
+Cada sessao finalizada soma, em cada grupo muscular do seu resumo: uma
+sessao, os exercicios concluidos, o volume (series x repeticoes dos
+concluidos) e o tempo (tempo medio por exercicio x exercicios do grupo,
+o que reparte o tempo total da sessao entre os grupos). O resumo e a
+fonte porque sessoes compactadas ou antigas ja nao tem TreinoProgresso
+e a ficha atual pode ter mudado.
+
+`registrar_sessao` atualiza os agregados ao finalizar; `reconstruir`
+recalcula tudo (ou a partir de uma data) numa unica consulta agregada.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from treinos.models import TreinoDiario, VolumeSemanal
+from treinos.utils import em_lotes
+
+TAMANHO_LOTE = 2000
+
+_SQL_SQLITE = """
+    INSERT INTO {tabela} (aluno_id, semana, grupo_muscular, sessoes, exercicios_concluidos, volume, tempo_total)
+    SELECT
+        d.aluno_id,
+        date(d.data, '-' || ((CAST(strftime('%%w', d.data) AS INTEGER) + 6) %% 7) || ' days'),
+        json_extract(e.value, '$.grupo'),
+        COUNT(DISTINCT d.id),
+        SUM(CASE WHEN json_extract(e.value, '$.concluido') THEN 1 ELSE 0 END),
+        SUM(CASE WHEN json_extract(e.value, '$.concluido')
+            THEN json_extract(e.value, '$.series') * json_extract(e.value, '$.repeticoes') ELSE 0 END),
+        SUM(COALESCE(d.tempo_medio_exercicio, 0))
+    FROM {sessoes} d, json_each(d.resumo, '$.exercicios') e
+    WHERE d.finalizado AND d.resumo IS NOT NULL AND d.data >= %s
+    GROUP BY 1, 2, 3
+"""
+
+_SQL_POSTGRESQL = """
+    INSERT INTO {tabela} (aluno_id, semana, grupo_muscular, sessoes, exercicios_concluidos, volume, tempo_total)
+    SELECT
+        d.aluno_id,
+        date_trunc('week', d.data)::date,
+        e ->> 'grupo',
+        COUNT(DISTINCT d.id),
+        SUM(CASE WHEN (e ->> 'concluido')::boolean THEN 1 ELSE 0 END),
+        SUM(CASE WHEN (e ->> 'concluido')::boolean
+            THEN (e ->> 'series')::integer * (e ->> 'repeticoes')::integer ELSE 0 END),
+        SUM(COALESCE(d.tempo_medio_exercicio, interval '0'))
+    FROM {sessoes} d CROSS JOIN LATERAL jsonb_array_elements(d.resumo -> 'exercicios') e
+    WHERE d.finalizado AND d.resumo IS NOT NULL AND d.data >= %s
+    GROUP BY 1, 2, 3
+"""
+
+_SQL_POR_BANCO = {"sqlite": _SQL_SQLITE, "postgresql": _SQL_POSTGRESQL}
+
+
+@dataclass
+class Parcela:
+    sessoes: int = 0
+    exercicios_concluidos: int = 0
+    volume: int = 0
+    tempo_total: timedelta = timedelta()
+
+
+def inicio_da_semana(dia: date) -> date:
+    """
+    Segunda-feira da semana ISO de `dia`.
+    """
+    return dia - timedelta(days=dia.weekday())
+
+
+def parcelas(resumo: dict, tempo_medio: timedelta | None) -> dict[str, Parcela]:
+    """
+    Contribuicao de uma sessao finalizada, por grupo muscular.
+    """
+    por_grupo: dict[str, Parcela] = {}
+    for item in resumo["exercicios"]:
+        parcela = por_grupo.setdefault(item["grupo"], Parcela(sessoes=1))
+        parcela.tempo_total += tempo_medio or timedelta()
+        if item["concluido"]:
+            parcela.exercicios_concluidos += 1
+            parcela.volume += item["series"] * item["repeticoes"]
+    return por_grupo
+
+
+def _somar(chave: dict, parcela: Parcela) -> int:
+    return VolumeSemanal.objects.filter(**chave).update(
+        sessoes=F("sessoes") + parcela.sessoes,
+        exercicios_concluidos=F("exercicios_concluidos") + parcela.exercicios_concluidos,
+        volume=F("volume") + parcela.volume,
+        tempo_total=F("tempo_total") + parcela.tempo_total,
+    )
+
+
+def registrar_sessao(sessao: TreinoDiario) -> None:
+    """
+    Soma a sessao recem-finalizada aos agregados da semana. Chamada uma vez,
+    dentro da transacao que grava `finalizado` e o resumo: uma leitura das
+    linhas da semana, um update por grupo ja existente e um insert em lote
+    para os novos.
+    """
+    if not sessao.finalizado or not sessao.resumo:
+        return
+    semana = inicio_da_semana(sessao.data)
+    por_grupo = parcelas(sessao.resumo, sessao.tempo_medio_exercicio)
+    da_semana = VolumeSemanal.objects.filter(aluno_id=sessao.aluno_id, semana=semana, grupo_muscular__in=por_grupo)
+    existentes = set(da_semana.values_list("grupo_muscular", flat=True))
+    novos = []
+    for grupo, parcela in por_grupo.items():
+        chave = {"aluno_id": sessao.aluno_id, "semana": semana, "grupo_muscular": grupo}
+        if grupo in existentes:
+            _somar(chave, parcela)
+        else:
+            novos.append(VolumeSemanal(**chave, **vars(parcela)))
+    if not novos:
+        return
+    try:
+        with transaction.atomic():
+            VolumeSemanal.objects.bulk_create(novos)
+    except IntegrityError:
+        # Outra sessao do aluno criou alguma das linhas entre a leitura e o insert.
+        for linha in novos:
+            chave = {"aluno_id": linha.aluno_id, "semana": semana, "grupo_muscular": linha.grupo_muscular}
+            if not _somar(chave, por_grupo[linha.grupo_muscular]):
+                linha.save(force_insert=True)
+
+
+def semana_inicial() -> date | None:
+    """
+    Onde `reconstruir()` comeca sem `desde`. Com a tabela vazia (primeira
+    carga), na semana da sessao mais antiga do banco, para que a semana
+    parcial tambem entre. Havendo agregados, na primeira segunda-feira a
+    partir dela: essa semana pode ter sido arquivada pela metade (o
+    arquivamento corta por mes), e recalcula-la apagaria dos agregados a
+    parte que saiu do banco.
+    """
+    mais_antiga = TreinoDiario.objects.order_by("data").values_list("data", flat=True).first()
+    if mais_antiga is None:
+        return None
+    semana = inicio_da_semana(mais_antiga)
+    if semana == mais_antiga or not VolumeSemanal.objects.exists():
+        return semana
+    return semana + timedelta(weeks=1)
+
+
+def reconstruir(desde: date | None = None) -> int:
+    """
+    Apaga e recalcula os agregados a partir da semana de `desde` ou, sem ela,
+    de `semana_inicial()`. Semanas anteriores, como as de sessoes ja
+    arquivadas, ficam como estao. Devolve o numero de linhas gravadas.
+    """
+    semana = inicio_da_semana(desde) if desde else semana_inicial()
+    if semana is None:
+        return 0
+    with transaction.atomic():
+        VolumeSemanal.objects.filter(semana__gte=semana).delete()
+        sql = _SQL_POR_BANCO.get(connection.vendor)
+        if sql is None:
+            return _reconstruir_em_python(semana)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql.format(tabela=VolumeSemanal._meta.db_table, sessoes=TreinoDiario._meta.db_table), [semana]
+            )
+            return cursor.rowcount
+
+
+def _reconstruir_em_python(semana: date) -> int:
+    """
+    Mesmo calculo do SQL para bancos sem funcoes JSON conhecidas, lendo as
+    sessoes em lotes.
+    """
+    totais: dict[tuple[int, date, str], Parcela] = {}
+    sessoes = (
+        TreinoDiario.objects.filter(finalizado=True, resumo__isnull=False, data__gte=semana)
+        .values_list("aluno_id", "data", "resumo", "tempo_medio_exercicio")
+        .iterator(chunk_size=TAMANHO_LOTE)
+    )
+    for aluno_id, dia, resumo, tempo_medio in sessoes:
+        for grupo, parcela in parcelas(resumo, tempo_medio).items():
+            total = totais.setdefault((aluno_id, inicio_da_semana(dia), grupo), Parcela())
+            total.sessoes += parcela.sessoes
+            total.exercicios_concluidos += parcela.exercicios_concluidos
+            total.volume += parcela.volume
+            total.tempo_total += parcela.tempo_total
+    linhas = (
+        VolumeSemanal(aluno_id=aluno_id, semana=inicio, grupo_muscular=grupo, **vars(total))
+        for (aluno_id, inicio, grupo), total in totais.items()
+    )
+    for lote in em_lotes(linhas, TAMANHO_LOTE):
+        VolumeSemanal.objects.bulk_create(lote)
+    return len(totais)
+
+
+def agrupar_por_semana(linhas) -> list[dict]:
+    """
+    Linhas `values()` de VolumeSemanal ja ordenadas por semana, agrupadas
+    para exibicao com os totais da semana.
+    """
+    semanas: list[dict] = []
+    for linha in linhas:
+        if not semanas or semanas[-1]["semana"] != linha["semana"]:
+            semanas.append(
+                {
+                    "semana": linha["semana"],
+                    "grupos": [],
+                    "exercicios_concluidos": 0,
+                    "volume": 0,
+                    "tempo_total": timedelta(),
+                }
+            )
+        semana = semanas[-1]
+        semana["grupos"].append(linha)
+        semana["exercicios_concluidos"] += linha["exercicios_concluidos"]
+        semana["volume"] += linha["volume"]
+        semana["tempo_total"] += linha["tempo_total"]
+    return semanas